@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+import holdings
+import instrument
+
+# Trading days in a year, used to annualise statistics of plain arrays whose
+# dates aren't known
+PERIODS_PER_YEAR = 252
+
+IRR_ITERATIONS = 50
+IRR_TOLERANCE = 1e-10
+
+
+def infer_periods_per_year(index, default=PERIODS_PER_YEAR):
+    """Return the number of rows a year of a date index spans, e.g. about 12
+    for month starts or 52 for weeks, from its first and last dates. Other
+    indexes (and plain arrays) use the default."""
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return default
+    years = (index[-1] - index[0]).days / 365.25
+    return (len(index) - 1) / years if years > 0 else default
+
+
+def as_2d(values):
+    """Return values as a (date x portfolio) array, viewing 1-D series as a
+    single portfolio"""
+    values = np.asarray(values, dtype=float)
+    return values[:, np.newaxis] if values.ndim == 1 else values
+
+
+def simple_returns(values, out=None):
+    """Return period on period simple returns of a (date x portfolio) array.
+    The first row is uncalculatable, so it is set to 0. Pass out (which may be
+    values itself) to compute in place."""
+    values = np.asarray(values, dtype=float)
+    if out is None:
+        out = np.empty_like(values)
+
+    # NumPy buffers overlapping operands, so out can be values itself
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(values[1:], values[:-1], out=out[1:])
+    out[1:] -= 1
+    out[:1] = 0
+    return out
+
+
+def log_returns(values, out=None):
+    """Return period on period log returns, with the first row set to 0"""
+    values = np.asarray(values, dtype=float)
+    if out is None:
+        out = np.empty_like(values)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(values[1:], values[:-1], out=out[1:])
+        np.log(out[1:], out=out[1:])
+    out[:1] = 0
+    return out
+
+
+@instrument.timed('daily_returns')
+def daily_returns(df):
+    """Return the simple returns of every column of a dataframe"""
+    return pd.DataFrame(simple_returns(df.values), index=df.index,
+                        columns=df.columns)
+
+
+def get_flows(trades, index, exchange='', quantity='Shares'):
+    """Return the cash put into (positive) or taken out of (negative) the
+    portfolio on each date of the index by the trades"""
+    trades = holdings.apply_exchange(trades, exchange)
+    rows = holdings.trade_rows(trades, index)
+    in_range = rows < index.size
+
+    cash = holdings.trade_signs(trades) * trades[quantity].values * \
+        trades['Price'].values
+
+    flows = np.zeros(index.size)
+    np.add.at(flows, rows[in_range], cash[in_range])
+    return flows
+
+
+def flow_returns(values, flows):
+    """Return the return of each period, without the flows, of each
+    portfolio. Flows on a date are assumed to arrive at the end of that date,
+    so they are taken out of that date's value before computing its return.
+    The first row, and periods starting from nothing or with a missing value,
+    have no return."""
+    values = as_2d(values)
+    flows = as_2d(flows)
+
+    returns = np.zeros(values.shape)
+    np.subtract(values[1:], flows[1:], out=returns[1:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(returns[1:], values[:-1], out=returns[1:])
+    returns[1:] -= 1
+
+    returns[~np.isfinite(returns)] = 0
+    return returns
+
+
+def time_weighted_return(values, flows):
+    """Return the time-weighted return of each portfolio over the whole
+    period (see flow_returns)"""
+    return np.prod(1 + flow_returns(values, flows), axis=0) - 1
+
+
+def money_weighted_return(values, flows, periods_per_year=None):
+    """Return the annualised money-weighted return (IRR) of each portfolio.
+
+    The investor pays each flow and receives the final value, and the rate
+    that discounts them all to zero is found with Newton's method, run for
+    every portfolio at once. The per row rate is annualised by default with
+    the rows per year of the values' dates."""
+    if periods_per_year is None:
+        periods_per_year = infer_periods_per_year(
+            getattr(values, 'index', None))
+    values = as_2d(values)
+    flows = as_2d(flows)
+
+    cash = -flows.copy()
+    cash[-1] += values[-1]
+    periods = np.arange(cash.shape[0], dtype=float)[:, np.newaxis]
+
+    # Per period rate, solved for all portfolios together
+    rate = np.zeros(cash.shape[1])
+    for _ in range(IRR_ITERATIONS):
+        discount = (1 + rate) ** -periods
+        npv = np.sum(cash * discount, axis=0)
+        slope = np.sum(-periods * cash * discount / (1 + rate), axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = npv / slope
+        step[~np.isfinite(step)] = 0
+        rate -= step
+        if np.all(np.abs(step) < IRR_TOLERANCE):
+            break
+
+    return (1 + rate) ** periods_per_year - 1
+
+
+def rolling_volatility(returns, window=30, periods_per_year=PERIODS_PER_YEAR,
+                       out=None):
+    """Return the annualised rolling standard deviation of returns. Rows
+    before the first full window, and windows holding a missing return, are
+    NaN."""
+    returns = as_2d(returns)
+    if out is None:
+        out = np.empty_like(returns)
+
+    # pandas updates each window's variance with a numerically stable online
+    # algorithm, rather than differencing whole-series running sums
+    std = pd.DataFrame(returns).rolling(window).std().values
+    np.multiply(std, np.sqrt(periods_per_year), out=out)
+    return out
+
+
+def sharpe_ratio(returns, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """Return the annualised Sharpe ratio of each portfolio"""
+    excess = as_2d(returns) - risk_free / periods_per_year
+    volatility = excess.std(axis=0, ddof=1)
+
+    # Flat returns have no volatility, so the ratio is undefined
+    ratio = np.full(volatility.shape, np.nan)
+    np.divide(excess.mean(axis=0), volatility, out=ratio,
+              where=volatility > 0)
+    return np.sqrt(periods_per_year) * ratio
+
+
+def sortino_ratio(returns, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """Return the annualised Sortino ratio: excess return over the downside
+    deviation"""
+    excess = as_2d(returns) - risk_free / periods_per_year
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=0))
+
+    # Without any downside the ratio is undefined
+    ratio = np.full(downside.shape, np.nan)
+    np.divide(excess.mean(axis=0), downside, out=ratio, where=downside > 0)
+    return np.sqrt(periods_per_year) * ratio
+
+
+def max_drawdown(values):
+    """Return the largest fall from a previous peak of each portfolio, as a
+    negative fraction of the peak"""
+    values = as_2d(values)
+    peaks = np.maximum.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = values / peaks - 1
+    drawdowns[peaks == 0] = 0
+    return drawdowns.min(axis=0)
+
+
+def beta(returns, benchmark_returns):
+    """Return the beta of each portfolio's returns against the benchmark's"""
+    returns = as_2d(returns)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+
+    benchmark_excess = benchmark_returns - benchmark_returns.mean()
+    covariance = benchmark_excess @ (returns - returns.mean(axis=0))
+    return covariance / (benchmark_excess @ benchmark_excess)
+
+
+def risk_report(df, benchmark='Benchmark', window=30, risk_free=0.0,
+                periods_per_year=None, flows=None):
+    """Return a risk report with a row for each portfolio column of a
+    (date x portfolio) dataframe, measured against the benchmark column.
+
+    The statistics are of the returns without the flows (e.g. from
+    get_flows), the cash paid in on each date, which the benchmark is
+    assumed to receive too. They are annualised by default with the rows per
+    year of the dates."""
+    if periods_per_year is None:
+        periods_per_year = infer_periods_per_year(df.index)
+    if flows is None:
+        flows = np.zeros(len(df))
+    portfolios = [column for column in df.columns if column != benchmark]
+    growth = 1 + flow_returns(df[portfolios].values, flows)
+    returns = growth[1:] - 1
+
+    report = pd.DataFrame(index=portfolios)
+    report['Return'] = np.prod(1 + returns, axis=0) - 1
+    report['Volatility'] = returns.std(axis=0, ddof=1) * \
+        np.sqrt(periods_per_year)
+    report['Rolling volatility'] = rolling_volatility(
+        returns, window, periods_per_year)[-1]
+    report['Sharpe'] = sharpe_ratio(returns, risk_free, periods_per_year)
+    report['Sortino'] = sortino_ratio(returns, risk_free, periods_per_year)
+    report['Max drawdown'] = max_drawdown(np.cumprod(growth, axis=0))
+
+    if benchmark in df.columns:
+        benchmark_returns = flow_returns(df[benchmark].values, flows)[1:, 0]
+        report['Beta'] = beta(returns, benchmark_returns)
+
+    return report
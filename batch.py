@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import holdings
+
+# Accounts valued together in one (account x date x symbol) tensor, which has
+# a column for each symbol the chunk's accounts trade
+ACCOUNT_CHUNK_SIZE = 64
+
+# Most memory one worker's tensor may take. Chunks are made smaller than
+# ACCOUNT_CHUNK_SIZE when the accounts trade too many symbols to fit.
+TENSOR_MEMORY_LIMIT = int(os.environ.get('PORTFOLIO_BATCH_MEMORY',
+                                         256 * 1024 ** 2))
+
+BATCH_WORKERS = int(os.environ.get('PORTFOLIO_BATCH_WORKERS',
+                                   os.cpu_count() or 1))
+
+# The shared price matrix, sent once to each worker process
+worker_prices = None
+
+
+def set_worker_prices(prices):
+    global worker_prices
+    worker_prices = prices
+
+
+def combine_ledgers(ledgers, prices, exchange=''):
+    """Stack the trades of every account into one dataframe with an integer
+    Account column, keeping only symbols with price data"""
+    frames = []
+    for account, trades in enumerate(ledgers):
+        for chunk in holdings.priced_trades(trades, prices, exchange):
+            frames.append(chunk.assign(Account=account))
+
+    if not frames:
+        return pd.DataFrame(columns=['Date', 'Symbol', 'Type', 'Shares',
+                                     'Price', 'Account'])
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def fit_chunk_size(trades, prices, chunk_size):
+    """Return the most accounts (up to chunk_size) whose tensor fits in
+    TENSOR_MEMORY_LIMIT, even if they trade every symbol traded by any
+    account"""
+    symbols = max(trades['Symbol'].nunique(), 1)
+    fits = TENSOR_MEMORY_LIMIT // (prices.index.size * symbols * 8 or 1)
+    return max(1, min(chunk_size, fits))
+
+
+def value_chunk(trades, num_accounts, benchmark_symbol, prices=None):
+    """Value one chunk of accounts, numbered from 0"""
+    if prices is None:
+        prices = worker_prices
+    return holdings.get_account_values(trades, prices, num_accounts,
+                                       benchmark_symbol)
+
+
+def value_portfolios(ledgers, prices, exchange='', benchmark_symbol=None,
+                     workers=None, chunk_size=ACCOUNT_CHUNK_SIZE):
+    """Value many portfolios against one shared price matrix.
+
+    Ledgers is a dict of account name to its trades. Accounts are valued
+    together in chunks, which are spread across worker processes. Returns a
+    dataframe with a (account, 'Portfolio'/'Benchmark') column for each
+    account."""
+    names = list(ledgers)
+    trades = combine_ledgers([ledgers[name] for name in names], prices, exchange)
+    workers = BATCH_WORKERS if workers is None else workers
+    chunk_size = fit_chunk_size(trades, prices, chunk_size)
+
+    # Split the accounts into chunks, renumbering each chunk's accounts from 0
+    starts = range(0, len(names), chunk_size)
+    chunks = []
+    for start in starts:
+        num_accounts = min(chunk_size, len(names) - start)
+        in_chunk = trades['Account'].between(start, start + num_accounts - 1)
+        chunk = trades[in_chunk].assign(
+            Account=trades.loc[in_chunk, 'Account'] - start)
+        chunks.append((chunk, num_accounts))
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = [value_chunk(chunk, num_accounts, benchmark_symbol, prices)
+                   for chunk, num_accounts in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=set_worker_prices,
+                                 initargs=(prices,)) as pool:
+            futures = [pool.submit(value_chunk, chunk, num_accounts,
+                                   benchmark_symbol)
+                       for chunk, num_accounts in chunks]
+            results = [future.result() for future in futures]
+
+    values = np.hstack([result[0] for result in results]) if results else \
+        np.zeros((prices.index.size, 0))
+    columns = [(name, 'Portfolio') for name in names]
+    blocks = [values]
+
+    if benchmark_symbol is not None and results:
+        blocks.append(np.hstack([result[1] for result in results]))
+        columns += [(name, 'Benchmark') for name in names]
+
+    portfolios = pd.DataFrame(np.hstack(blocks), index=prices.index.values,
+                              columns=pd.MultiIndex.from_tuples(columns))
+
+    # Group each account's columns together
+    return portfolios[names] if names else portfolios
@@ -0,0 +1,85 @@
+import time
+import numpy as np
+import pandas as pd
+import holdings
+import synthetic
+
+BENCHMARK_SYMBOL = '^AXJO'
+
+# The per-trade loop is linear in the number of trades, so it is only timed on
+# a sample and extrapolated for larger ledgers
+LOOP_SAMPLE_SIZE = 2000
+
+
+def loop_portfolio_value_over_time(trades, prices, benchmark_symbol=BENCHMARK_SYMBOL):
+    """The original per-trade valuation loop, kept as a reference"""
+    holdings = pd.DataFrame(data=np.zeros((prices.index.values.size, 2)),
+                            index=prices.index.values,
+                            columns=['Portfolio', 'Benchmark'])
+
+    for index, trade in trades.iterrows():
+        symbol = trade.Symbol
+
+        if symbol not in prices.columns:
+            continue
+
+        trade_holding = pd.Series(data=0.0, index=prices.index.values)
+        bm_holding = pd.Series(data=0.0, index=prices.index.values)
+
+        sign = 1 if trade.Type == 'Buy' else -1
+
+        trade_holding.loc[trade['Date']:] = sign * trade.Shares * prices[symbol]
+
+        adjusted_bm_shares = trade.Shares * trade.Price / \
+            prices.loc[trade['Date'], benchmark_symbol]
+        bm_holding.loc[trade['Date']:] = sign * \
+            adjusted_bm_shares * prices[benchmark_symbol]
+
+        holdings['Portfolio'] += trade_holding
+        holdings['Benchmark'] += bm_holding
+
+    return holdings
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(trade_counts=(10000, 100000, 1000000), num_symbols=500, years=15):
+    dates = synthetic.make_dates(years)
+    symbols = synthetic.make_symbols(num_symbols)
+    prices = synthetic.make_prices([BENCHMARK_SYMBOL] + symbols, dates)
+
+    print('{:>10} {:>14} {:>14} {:>10}'.format(
+        'trades', 'loop (s)', 'vectorized (s)', 'speedup'))
+
+    for num_trades in trade_counts:
+        # Trades are only made in the stocks, not the benchmark
+        trades = synthetic.make_trades(num_trades, prices[symbols],
+                                       synthetic.CURRENCIES[:1])
+
+        vector_time, result = time_call(
+            holdings.get_portfolio_value_over_time, trades, prices,
+            benchmark_symbol=BENCHMARK_SYMBOL)
+
+        sample = trades.iloc[:LOOP_SAMPLE_SIZE]
+        loop_time, expected = time_call(
+            loop_portfolio_value_over_time, sample, prices)
+        loop_time *= num_trades / len(sample)
+
+        # Check the engines agree on the sample before trusting the timings
+        sample_result = holdings.get_portfolio_value_over_time(
+            sample, prices, benchmark_symbol=BENCHMARK_SYMBOL)
+        np.testing.assert_allclose(sample_result.values, expected.values,
+                                   rtol=1e-9, atol=1e-6)
+
+        estimated = '~' if num_trades > len(sample) else ''
+        print('{:>10} {:>14} {:>14.3f} {:>9.0f}x'.format(
+            num_trades, estimated + '{:.3f}'.format(loop_time), vector_time,
+            loop_time / vector_time))
+
+
+if __name__ == "__main__":
+    run()
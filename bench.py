@@ -0,0 +1,221 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import pandas as pd
+import analytics
+import file
+import forex
+import holdings
+import pipeline
+import pricing
+import synthetic
+
+BENCH_DIRECTORY = 'bench-data'
+RESULTS_DIRECTORY = 'bench-results'
+
+# Symbols, years of daily prices, trades and currencies for each scale
+SCALES = {
+    'small': dict(num_symbols=20, years=5, num_trades=1000, num_currencies=2),
+    'medium': dict(num_symbols=200, years=10, num_trades=100000,
+                   num_currencies=4),
+    'large': dict(num_symbols=1000, years=20, num_trades=1000000,
+                  num_currencies=8),
+}
+
+# Timed runs of each stage; the fastest is kept
+REPEATS = 3
+
+# A stage this many times slower than the last run at the same scale is
+# reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def make_stages(dates):
+    """Return the (name, function, rows processed) stages of a valuation run,
+    each taking the results of the stages before it"""
+    def read_trades(results):
+        return file.read_trades_csv()
+
+    def construct_prices(results):
+        symbols = results['read_trades']['Symbol'].unique().tolist()
+        return pricing.construct(symbols, dates, pipeline.read_close)
+
+    def construct_forex(results):
+        # Built directly so the rate matrix cache isn't measured
+        currencies = results['read_trades']['Currency'].unique().tolist()
+        matrix = forex.build_rate_matrix(currencies)
+        return forex.rates_asof(matrix, dates)
+
+    def value(results):
+        return holdings.get_converted_value_over_time(
+            results['read_trades'], results['construct_prices'],
+            results['construct_forex'])
+
+    def daily_returns(results):
+        return analytics.daily_returns(results['value'])
+
+    return [
+        ('read_trades', read_trades, lambda results: len(results['read_trades'])),
+        ('construct_prices', construct_prices,
+         lambda results: results['construct_prices'].size),
+        ('construct_forex', construct_forex,
+         lambda results: results['construct_forex'].size),
+        ('value', value, lambda results: len(results['read_trades'])),
+        ('daily_returns', daily_returns, lambda results: len(results['value'])),
+    ]
+
+
+def measure(stages):
+    """Time each stage (fastest of REPEATS), then run it once more under
+    tracemalloc for its peak memory, so tracing doesn't skew the timings"""
+    results = {}
+    measurements = {}
+
+    for name, run, rows in stages:
+        seconds = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            results[name] = run(results)
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        run(results)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        processed = rows(results)
+        measurements[name] = {
+            'seconds': min(seconds),
+            'first_seconds': seconds[0],
+            'rows': processed,
+            'rows_per_second': processed / min(seconds) if min(seconds) else None,
+            'peak_memory': peak,
+        }
+
+    return measurements
+
+
+def previous_result(scale):
+    """Return the most recent saved result at the scale, or None"""
+    try:
+        names = sorted(os.listdir(RESULTS_DIRECTORY))
+    except FileNotFoundError:
+        return None
+
+    for name in reversed(names):
+        with open(os.path.join(RESULTS_DIRECTORY, name)) as handle:
+            result = json.load(handle)
+        if result['scale'] == scale:
+            return result
+    return None
+
+
+def find_regressions(result, previous, threshold=REGRESSION_THRESHOLD):
+    """Return (stage, previous seconds, seconds) for every stage that got
+    slower than threshold times its previous time"""
+    regressions = []
+    for name, stage in result['stages'].items():
+        before = previous['stages'].get(name)
+        if before and stage['seconds'] > before['seconds'] * threshold:
+            regressions.append((name, before['seconds'], stage['seconds']))
+    return regressions
+
+
+def save_result(result):
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+    name = '{}-{}-{}.json'.format(result['timestamp'].replace(':', ''),
+                                  result['scale'], result['revision'])
+    path = os.path.join(RESULTS_DIRECTORY, name)
+    with open(path, 'w') as handle:
+        json.dump(result, handle, indent=1)
+    return path
+
+
+def report(result, previous):
+    print('{:>18} {:>10} {:>12} {:>14} {:>10}'.format(
+        'stage', 'time (s)', 'rows/s', 'peak mem (MB)', 'vs last'))
+
+    for name, stage in result['stages'].items():
+        change = ''
+        if previous and name in previous['stages']:
+            change = '{:+.0%}'.format(
+                stage['seconds'] / previous['stages'][name]['seconds'] - 1)
+        print('{:>18} {:>10.4f} {:>12.0f} {:>14.1f} {:>10}'.format(
+            name, stage['seconds'], stage['rows_per_second'] or 0,
+            stage['peak_memory'] / 1e6, change))
+
+
+def run(scale='small', regenerate=False, save=True):
+    settings = SCALES[scale]
+    directory = os.path.join(BENCH_DIRECTORY, scale)
+
+    # The data only depends on the scale, so it is kept between runs
+    if regenerate or not os.path.exists(os.path.join(directory, 'trades.csv')):
+        dates = synthetic.generate(directory, **settings)
+    else:
+        file.DATA_DIRECTORY = directory
+        dates = synthetic.make_dates(settings['years'])
+
+    dates = pd.date_range(dates[0], dates[-1], freq='MS')
+
+    result = {
+        'scale': scale,
+        'settings': settings,
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'stages': measure(make_stages(dates)),
+    }
+
+    previous = previous_result(scale)
+    report(result, previous)
+
+    regressions = find_regressions(result, previous) if previous else []
+    for name, before, after in regressions:
+        print('Regression in {}: {:.4f}s -> {:.4f}s (revision {})'.format(
+            name, before, after, previous['revision']))
+
+    if save:
+        print('Saved', save_result(result))
+
+    return result, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the valuation stages on synthetic data')
+    parser.add_argument('scale', nargs='?', default='small',
+                        choices=sorted(SCALES))
+    parser.add_argument('--regenerate', action='store_true',
+                        help='rewrite the synthetic data first')
+    parser.add_argument('--no-save', action='store_true',
+                        help="don't keep the result for later comparison")
+    parser.add_argument('--check', action='store_true',
+                        help='exit with an error if any stage regressed')
+    args = parser.parse_args()
+
+    _, regressions = run(args.scale, regenerate=args.regenerate,
+                         save=not args.no_save)
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import holdings
+import lookup
+
+
+def normalize_benchmarks(benchmarks):
+    """Return benchmarks as a dict of name to {symbol: weight}.
+
+    Benchmarks may be a symbol, a list of symbols, or a dict of name to either
+    a symbol or a blend of symbols, e.g.
+    {'ASX 200': '^AXJO', 'Blend': {'^AXJO': 0.6, '^GSPC': 0.4}}"""
+    if isinstance(benchmarks, str):
+        benchmarks = [benchmarks]
+    if not isinstance(benchmarks, dict):
+        benchmarks = {symbol: symbol for symbol in benchmarks}
+
+    normalized = {}
+    for name, components in benchmarks.items():
+        if isinstance(components, str):
+            components = {components: 1.0}
+        normalized[name] = dict(components)
+    return normalized
+
+
+def get_component_units(trades, prices, legs):
+    """Return a (trade x leg) array of the benchmark units each trade's cash
+    would have bought, where legs are (symbol, weight) pairs"""
+    cash = holdings.trade_signs(trades) * trades['Shares'].values * \
+        trades['Price'].values
+
+    # Missing prices are filled with zeros by the price loaders
+    index = lookup.PriceIndex.from_frame(
+        prices[sorted({symbol for symbol, _ in legs})])
+
+    units = np.empty((len(trades), len(legs)))
+    for leg, (symbol, weight) in enumerate(legs):
+        units[:, leg] = cash * weight / index.asof(symbol, trades['Date'])
+
+    return units
+
+
+def get_legs(benchmarks):
+    """Return the benchmark names, their (symbol, weight) legs and a (leg x
+    benchmark) matrix of which benchmark each leg belongs to"""
+    benchmarks = normalize_benchmarks(benchmarks)
+    names = list(benchmarks)
+    legs = [(symbol, weight) for name in names
+            for symbol, weight in benchmarks[name].items()]
+
+    membership = np.zeros((len(legs), len(names)))
+    leg = 0
+    for column, name in enumerate(names):
+        for _ in benchmarks[name]:
+            membership[leg, column] = 1
+            leg += 1
+
+    return names, legs, membership
+
+
+def add_units(changes, trades, rows, prices, legs, accounts=0):
+    """Add the benchmark units each trade's cash buys (or sells) to an
+    (account x date x leg) matrix of changes, at the trade's date row"""
+    np.add.at(changes, (accounts, rows),
+              get_component_units(trades, prices, legs))
+
+
+def value_units(changes, prices, legs, membership):
+    """Carry (account x date x leg) unit changes forward in place and value
+    them, giving (account x date x benchmark) values"""
+    positions = np.cumsum(changes, axis=1, out=changes)
+    leg_prices = prices[[symbol for symbol, _ in legs]].values
+
+    # Dates before a position is opened have no value, even with no price
+    values = np.where(positions == 0, 0, positions * leg_prices)
+
+    return values @ membership
+
+
+def get_benchmark_values(trades, prices, benchmarks, exchange='',
+                         skip_unpriced=True):
+    """Value the same cash flows as the trades invested in each benchmark.
+
+    Every trade's cash buys (or sells) units of every benchmark component at
+    once. The units are scattered into one (date x leg) matrix, carried
+    forward, multiplied by the component prices and summed into a column per
+    benchmark, so any number of benchmarks take a single pass.
+
+    Trades may be a dataframe or an iterable of chunks. Trades in symbols
+    missing from the prices are skipped, unless skip_unpriced is False (e.g.
+    when prices only holds the benchmarks)."""
+    names, legs, membership = get_legs(benchmarks)
+
+    index = prices.index
+    changes = np.zeros((1, index.size, len(legs)))
+
+    if skip_unpriced:
+        trades = holdings.priced_trades(trades, prices, exchange)
+
+    for chunk in holdings.as_chunks(trades):
+        rows = holdings.trade_rows(chunk, index)
+        chunk, rows = holdings.in_range(chunk, rows, index.size)
+        add_units(changes, chunk, rows, prices, legs)
+
+    values = value_units(changes, prices, legs, membership)[0]
+
+    return pd.DataFrame(values, index=index.values, columns=names)
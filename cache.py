@@ -0,0 +1,137 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+import file
+import store
+import warehouse
+
+CACHE_DIRECTORY = "cache"
+
+# Total size of the cached matrices kept on disk, and the number kept in memory
+CACHE_SIZE_LIMIT = int(os.environ.get('PORTFOLIO_CACHE_SIZE', 512 * 1024 ** 2))
+MEMORY_ENTRIES = 8
+
+# How to tell whether an underlying file has changed: 'mtime' compares the
+# modification time and size, 'hash' compares a hash of the file contents
+CACHE_VALIDATION = os.environ.get('PORTFOLIO_CACHE_VALIDATION', 'mtime')
+
+memory_cache = OrderedDict()
+
+
+def make_key(source, symbols, dates):
+    """Return a key for matrices built from the given source, symbols and
+    date range (None when the matrix covers all stored dates), read through
+    the current store backend"""
+    if dates is None:
+        parts = (source, store.backend(), tuple(symbols))
+    else:
+        freq = getattr(dates, 'freqstr', None)
+        parts = (source, store.backend(), tuple(symbols), str(dates[0]),
+                 str(dates[-1]), len(dates), freq)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(paths):
+    """Return a summary of the underlying files that changes whenever any of
+    them is modified, created or deleted"""
+    summary = []
+    for path in paths:
+        try:
+            if CACHE_VALIDATION == 'hash':
+                summary.append((path, hash_file(path)))
+            else:
+                stat = os.stat(path)
+                summary.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            summary.append((path, None))
+    return summary
+
+
+def cache_path(key):
+    return file.make_path(key, CACHE_DIRECTORY, 'pkl')
+
+
+def evict(limit=CACHE_SIZE_LIMIT):
+    """Delete the least recently used cache files until they fit in limit"""
+    directory = os.path.join(file.DATA_DIRECTORY, CACHE_DIRECTORY)
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.pkl'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        os.remove(path)
+        total -= size
+
+
+def remember(key, entry):
+    memory_cache[key] = entry
+    memory_cache.move_to_end(key)
+    while len(memory_cache) > MEMORY_ENTRIES:
+        memory_cache.popitem(last=False)
+
+
+def load(key):
+    """Return the cached (fingerprint, value) for key, or None"""
+    if key in memory_cache:
+        memory_cache.move_to_end(key)
+        return memory_cache[key]
+
+    path = cache_path(key)
+    try:
+        with open(path, 'rb') as handle:
+            entry = pickle.load(handle)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+    # Mark as recently used for eviction
+    os.utime(path)
+    remember(key, entry)
+    return entry
+
+
+def save(key, entry):
+    remember(key, entry)
+
+    path = cache_path(key)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as handle:
+        pickle.dump(entry, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+    evict()
+
+
+def cached(source, symbols, dates, paths, build):
+    """Return build(), reusing the value cached for the same source, symbols
+    and date range as long as none of the files at paths have changed. The
+    cached value is shared, so it shouldn't be modified in place."""
+    key = make_key(source, symbols, dates)
+
+    # Histories read from the warehouse change with the database, whose
+    # writes land in its write-ahead log first
+    if store.backend() == 'warehouse':
+        database = warehouse.warehouse_path()
+        paths = list(paths) + [database, database + '-wal']
+    current = fingerprint(paths)
+
+    entry = load(key)
+    if entry is not None and entry[0] == current:
+        return entry[1]
+
+    value = build()
+    save(key, (current, value))
+    return value
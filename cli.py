@@ -0,0 +1,142 @@
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+# Never load matplotlib, e.g. for cron-driven valuations on servers. Plots
+# are refused rather than importing a GUI backend.
+HEADLESS = os.environ.get('PORTFOLIO_HEADLESS', '') == '1'
+
+# Seconds spent importing each module loaded by a command
+import_times = {}
+
+started = time.perf_counter()
+
+
+def load(name):
+    """Import a module the first time a command needs it, timing the import.
+    Hyphenated script names (e.g. market-data-yfinance) are loaded from their
+    file."""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    start = time.perf_counter()
+    if '-' in name:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            name + '.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - start
+
+    return module
+
+
+def make_analysis(args):
+    pipeline = load('pipeline')
+
+    analysis = pipeline.Analysis(frequency=args.frequency) \
+        .between(args.start, args.end)
+    if args.symbols:
+        analysis = analysis.only(args.symbols.split(','))
+    if args.benchmark:
+        analysis = analysis.against(args.benchmark)
+    if args.compact:
+        analysis = analysis.compacted()
+    return analysis
+
+
+def write_frame(df, output):
+    if output:
+        df.to_csv(output)
+    else:
+        print(df.to_string())
+
+
+def value(args):
+    write_frame(make_analysis(args).value(), args.output)
+
+
+def report(args):
+    write_frame(make_analysis(args).report(), args.output)
+
+
+def plot(args):
+    if HEADLESS or args.headless:
+        sys.exit('Plotting is disabled in headless mode')
+
+    # Saved charts are drawn without a display
+    make_analysis(args).plot(path=args.output)
+
+
+def refresh(args):
+    file = load('file')
+    ledger = load('ledger')
+    downloader = load('market-data-yfinance')
+
+    trades = ledger.TradeIndex(file.read_trades_csv())
+    downloader.download_forex(trades, incremental=not args.full)
+    downloader.download_historic_prices(trades, incremental=not args.full)
+
+
+def report_import_times():
+    total = time.perf_counter() - started
+    print('Imports:', file=sys.stderr)
+    for name, seconds in sorted(import_times.items(), key=lambda item: -item[1]):
+        print('  {:<24} {:8.3f}s'.format(name, seconds), file=sys.stderr)
+    print('Total run time: {:.3f}s'.format(total), file=sys.stderr)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description='Value, report on and plot the portfolio in data/trades.csv')
+    parser.add_argument('--headless', action='store_true',
+                        help='never load matplotlib (or set PORTFOLIO_HEADLESS=1)')
+    parser.add_argument('--import-times', action='store_true',
+                        help='print the time spent importing each module')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, run, summary in [('value', value, 'print the value over time'),
+                               ('report', report, 'print a risk report'),
+                               ('plot', plot, 'plot the value over time')]:
+        command = commands.add_parser(name, help=summary)
+        command.add_argument('--start', help='first date, e.g. 2016-07-16')
+        command.add_argument('--end', help='last date, e.g. 2017-07-14')
+        command.add_argument('--symbols', help='comma separated symbols')
+        command.add_argument('--benchmark', help='benchmark symbol, e.g. ^AXJO')
+        command.add_argument('--frequency', default='MS',
+                             help='pandas frequency of the dates (default MS)')
+        command.add_argument('--compact', action='store_true',
+                             help='use float32 prices and run-length positions')
+        if name == 'plot':
+            command.add_argument('--output',
+                                 help='save the chart here (.png or .svg, '
+                                 'default charts/portfolio-value.png)')
+        else:
+            command.add_argument('--output', help='write a csv here instead')
+        command.set_defaults(run=run)
+
+    command = commands.add_parser(
+        'refresh', help='download new prices and forex from Yahoo Finance')
+    command.add_argument('--full', action='store_true',
+                         help='download every history from scratch')
+    command.set_defaults(run=refresh)
+
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    args.run(args)
+
+    if args.import_times:
+        report_import_times()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+import holdings
+import instrument
+import lookup
+
+# Compact price and position storage for very large universes, e.g. 5,000
+# symbols of 20 years of daily prices, where dense float64 price and position
+# matrices take over 1 GB each.
+#
+# Precision:
+# - Prices are float32, which keeps about 7 significant digits: each price is
+#   within a relative 6e-8 (2^-24) of the float64 value, e.g. $123.4567 is
+#   exact to the cent and beyond. Prices are widened to float64 before they are
+#   multiplied, so a portfolio value is within the same relative 6e-8 of the
+#   dense result (about 6 cents on $1M).
+# - Dates are int32 days since 1970-01-01, which is exact for every date pandas
+#   can represent. Times of day are dropped.
+# - Positions stay float64, so whole share counts are exact up to 2^53.
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+PRICE_DTYPE = np.float32
+
+# Position columns expanded to a dense block at a time when valuing
+COLUMN_BLOCK = 256
+
+
+def to_days(dates):
+    """Return dates as int32 days since the epoch"""
+    days = pd.DatetimeIndex(dates).values.astype('datetime64[D]') - EPOCH
+    return days.astype(np.int32)
+
+
+def from_days(days):
+    return pd.DatetimeIndex(EPOCH + np.asarray(days).astype('timedelta64[D]'))
+
+
+class CompactPrices:
+    """A (date x symbol) float32 price matrix indexed by int32 day offsets"""
+
+    def __init__(self, days, columns, values):
+        self.days = days
+        self.columns = pd.Index(columns)
+        self.values = values
+        self.attrs = {}
+
+    @classmethod
+    def from_frame(cls, prices):
+        return cls(to_days(prices.index), prices.columns,
+                   prices.values.astype(PRICE_DTYPE))
+
+    @classmethod
+    def assemble(cls, frames, dates, required=None, fill_value=0,
+                 asof=False):
+        """Compact equivalent of pricing.assemble, writing each frame straight
+        into the float32 matrix so no float64 matrix is ever built"""
+        columns = [column for frame in frames for column in frame.columns]
+        values = np.full((len(dates), len(columns)), np.nan, dtype=PRICE_DTYPE)
+
+        column = 0
+        for frame in frames:
+            width = frame.columns.size
+            aligned = lookup.asof_frame(frame, dates) if asof else \
+                frame.reindex(dates)
+            values[:, column:column + width] = aligned.values
+            column += width
+
+        days = to_days(dates)
+
+        # Drop any dates the required symbol didn't trade on
+        if required is not None and required in columns:
+            keep = ~np.isnan(values[:, columns.index(required)])
+            values = values[keep]
+            days = days[keep]
+
+        if fill_value is not None:
+            np.nan_to_num(values, copy=False, nan=fill_value)
+
+        return cls(days, columns, values)
+
+    @property
+    def index(self):
+        return from_days(self.days)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.days.nbytes
+
+    def trade_rows(self, dates):
+        """Return the row each trade date first applies to, as
+        holdings.trade_rows does"""
+        return np.searchsorted(self.days, to_days(dates), side='left')
+
+    def to_frame(self):
+        return pd.DataFrame(self.values.astype(float), index=self.index,
+                            columns=self.columns)
+
+
+class RunLengthPositions:
+    """Cumulative positions stored as runs rather than a dense matrix.
+
+    Each column only keeps the rows where its position changes and the
+    position from then on, sorted by column then row, so a symbol held for a
+    few weeks costs a few entries rather than a full column of zeros. Memory
+    is proportional to the number of trades, not dates x columns."""
+
+    def __init__(self, columns, num_rows, offsets, rows, positions):
+        self.columns = columns
+        self.num_rows = num_rows
+        # Runs of column i are at offsets[i]:offsets[i + 1]
+        self.offsets = offsets
+        self.rows = rows
+        self.positions = positions
+
+    @classmethod
+    def from_trades(cls, trades, prices, columns, quantity='Shares'):
+        """Build the positions of the trades on the rows of compact prices.
+        Trades may be a dataframe or an iterable of chunks."""
+        rows = []
+        quantities = []
+        keys = []
+
+        for chunk in holdings.as_chunks(trades):
+            chunk, chunk_rows = holdings.in_range(
+                chunk, prices.trade_rows(chunk['Date']), prices.days.size)
+            rows.append(chunk_rows)
+            quantities.append(holdings.trade_signs(chunk) *
+                              chunk[quantity].values.astype(float))
+            keys.append(chunk[columns].astype(object))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        quantities = np.concatenate(quantities) if quantities else np.zeros(0)
+        keys = pd.concat(keys) if keys else pd.DataFrame(columns=columns)
+
+        codes, labels = holdings.factorize_keys(keys, columns)
+
+        # Running position within each column, in date order
+        order = np.lexsort((rows, codes))
+        codes = codes[order]
+        rows = rows[order]
+        running = np.cumsum(quantities[order])
+        offsets = np.searchsorted(codes, np.arange(len(labels) + 1))
+        before = np.concatenate([[0.0], running])[offsets[codes]]
+        positions = running - before
+
+        # Several trades on the same row make one run
+        last = np.ones(codes.size, dtype=bool)
+        last[:-1] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+        codes = codes[last]
+        offsets = np.searchsorted(codes, np.arange(len(labels) + 1))
+
+        return cls(labels, prices.days.size, offsets,
+                   rows[last].astype(np.int32), positions[last])
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.rows.nbytes + self.positions.nbytes
+
+    def dense(self, start=0, stop=None):
+        """Return a dense (date x column) float64 block of columns start to
+        stop"""
+        stop = len(self.columns) if stop is None else stop
+        block = np.zeros((self.num_rows, stop - start))
+
+        first, last = self.offsets[start], self.offsets[stop]
+        codes = np.repeat(np.arange(stop - start),
+                          np.diff(self.offsets[start:stop + 1]))
+        positions = self.positions[first:last]
+
+        # Scatter the change at the start of each run, then carry forward.
+        # The first run of each column changes from zero.
+        changes = np.diff(positions, prepend=0.0)
+        column_starts = self.offsets[start:stop] - first
+        column_starts = column_starts[column_starts < positions.size]
+        changes[column_starts] = positions[column_starts]
+        block[self.rows[first:last], codes] = changes
+
+        return np.cumsum(block, axis=0, out=block)
+
+    def to_frame(self, index=None):
+        return pd.DataFrame(self.dense(), index=index, columns=self.columns)
+
+    def value(self, prices, forex=None):
+        """Return the value on each row of the positions against compact
+        prices, and the forex frame when the columns are (Symbol, Currency).
+        Only COLUMN_BLOCK columns are ever expanded at once."""
+        multi = isinstance(self.columns, pd.MultiIndex)
+        symbols = self.columns.get_level_values('Symbol') if multi \
+            else self.columns
+        price_columns = prices.columns.get_indexer(symbols)
+
+        if forex is not None:
+            currencies = self.columns.get_level_values('Currency')
+            unique = currencies.unique()
+            rates = forex.reindex(index=prices.index, columns=unique).values
+            rate_columns = unique.get_indexer(currencies)
+
+        total = np.zeros(self.num_rows)
+        for start in range(0, len(self.columns), COLUMN_BLOCK):
+            stop = min(start + COLUMN_BLOCK, len(self.columns))
+            held = self.dense(start, stop)
+
+            values = held * prices.values[:, price_columns[start:stop]]
+            if forex is not None:
+                values *= rates[:, rate_columns[start:stop]]
+
+            # Dates before a position is opened have no value, even when the
+            # price or forex rate on that date is missing
+            values[held == 0] = 0
+            total += values.sum(axis=1)
+
+        return total
+
+
+@instrument.timed('value_compact')
+def get_portfolio_value_over_time(trades, prices, exchange=''):
+    """Value the trades against CompactPrices without any dense (date x
+    symbol) float64 matrix. Trades may be a dataframe or an iterable of
+    chunks."""
+    positions = RunLengthPositions.from_trades(
+        holdings.priced_trades(trades, prices, exchange), prices, ['Symbol'])
+
+    values = pd.DataFrame(index=prices.index.values)
+    values['Portfolio'] = positions.value(prices)
+    return values
+
+
+@instrument.timed('value_compact_converted')
+def get_converted_value_over_time(trades, prices, forex, quantity='Quantity'):
+    """Compact equivalent of holdings.get_converted_value_over_time"""
+    positions = RunLengthPositions.from_trades(
+        holdings.priced_trades(trades, prices), prices,
+        ['Symbol', 'Currency'], quantity=quantity)
+
+    values = pd.DataFrame(index=prices.index.values)
+    values['Portfolio'] = positions.value(prices, forex).round(2)
+    return values
@@ -0,0 +1,125 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import instrument
+
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+
+# Responses worth retrying: rate limited or a temporary server failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Errors worth retrying: the connection failed, timed out or dropped part way
+# through the body
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError)
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    """Return a session whose connection pool can hold a connection per
+    worker, so TCP/TLS connections are reused across requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class RateLimiter:
+    """Spaces out requests so that at most `rate` requests start per second
+    for each key (e.g. a host or a provider). Safe to share between threads
+    and event loops, as waiting is left to the caller."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_start = {}
+
+    def reserve(self, key):
+        """Reserve the next free slot for key, returning the seconds to wait
+        before starting the request"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(key, now))
+            self.next_start[key] = start + self.interval
+        return start - now
+
+
+def backoff_delay(attempt, response=None):
+    """Return how long to wait before retry number `attempt` (from 0),
+    honouring a server's Retry-After header when it gives one in seconds"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), BACKOFF_CAP)
+
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def stream_to_file(response, path):
+    """Stream a response body to path, replacing the file only once the whole
+    body has arrived. A partial body is deleted."""
+    temp_path = path + '.part'
+    try:
+        with open(temp_path, 'wb') as handle:
+            for block in response.iter_content(CHUNK_SIZE):
+                handle.write(block)
+                instrument.count('download_bytes', len(block))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def fetch(session, url, read, retries=DEFAULT_RETRIES,
+          timeout=DEFAULT_TIMEOUT, label=None):
+    """Request url and return read(response), retrying connection errors
+    (including ones part way through reading the body), 429s and 5xxs with
+    exponential backoff. The timeout applies to connecting and to each read,
+    so a stalled server fails the attempt instead of blocking."""
+    for attempt in range(retries + 1):
+        try:
+            with instrument.span('fetch', path=label, attempt=attempt):
+                response = session.get(url, stream=True, timeout=timeout)
+
+            with response:
+                retry = response.status_code in RETRY_STATUSES and \
+                    attempt < retries
+                if not retry:
+                    response.raise_for_status()
+                    return read(response)
+                delay = backoff_delay(attempt, response)
+        except RETRY_ERRORS:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+
+        time.sleep(delay)
+
+
+def fetch_to_file(session, url, path, retries=DEFAULT_RETRIES,
+                  timeout=DEFAULT_TIMEOUT):
+    """Download url to path, retrying as fetch does"""
+    def read(response):
+        with instrument.span('stream', path=path):
+            stream_to_file(response, path)
+        return path
+
+    return fetch(session, url, read, retries, timeout, label=path)
+
+
+def fetch_text(session, url, retries=DEFAULT_RETRIES,
+               timeout=DEFAULT_TIMEOUT):
+    """Return the body of url as text, retrying as fetch does"""
+    return fetch(session, url, lambda response: response.text, retries,
+                 timeout)
+
@@ -1,12 +1,31 @@
 import os
 import pandas as pd
+import instrument
 
 DATA_DIRECTORY = "data"
 PRICES_DIRECTORY = "historical_prices"
 
+# Yahoo and Xignite downloads read by portfolio.py and
+# portfolio-excl-benchmark.py
+LEGACY_PRICES_DIRECTORY = "historical-prices"
 
-def make_path(name, parent_dir=PRICES_DIRECTORY):
-    """Return CSV file path given filename."""
+# Compact dtypes for trades columns, used when they are present in the file
+TRADES_DTYPES = {
+    'Symbol': 'category',
+    'Type': 'category',
+    'Currency': 'category',
+    'Shares': 'float32',
+    'Quantity': 'float32',
+    'Price': 'float64',
+    'Commission': 'float32',
+}
+
+# Rows of trades read at a time when streaming
+TRADES_CHUNK_SIZE = 1000000
+
+
+def make_path(name, parent_dir=PRICES_DIRECTORY, extension='csv'):
+    """Return CSV (or other extension) file path given filename."""
     output_dir = os.path.join(DATA_DIRECTORY, parent_dir)
 
     # Make directory if it doesn't already exist
@@ -15,18 +34,65 @@ def make_path(name, parent_dir=PRICES_DIRECTORY):
     except FileExistsError:
         pass
 
-    return os.path.join(output_dir, "{}.csv".format(str(name)))
+    return os.path.join(output_dir, "{}.{}".format(str(name), extension))
+
+
+def trades_dtypes(path):
+    """Return the compact dtypes for the columns in the trades csv"""
+    columns = pd.read_csv(path, nrows=0).columns
+    return {column: dtype for column, dtype in TRADES_DTYPES.items()
+            if column in columns}
 
 
-def read_trades_csv():
+def read_trades_csv(compact=False):
     """Read in the trades csv and store it in a dataframe"""
     path = make_path('trades', '')
 
     # Read data in from csv file
-    df = pd.read_csv(path,
-                     parse_dates=['Date'])
+    with instrument.span('read_trades'):
+        df = pd.read_csv(path,
+                         parse_dates=['Date'],
+                         dtype=trades_dtypes(path) if compact else None)
 
-    # Drop rows where any column is empty
-    df = df.dropna(axis=0)
+        # Drop rows where any column is empty
+        df = df.dropna(axis=0)
+
+    instrument.count('trade_rows', len(df))
+    instrument.count('trade_bytes', os.path.getsize(path))
 
     return df
+
+
+def iter_trades_csv(chunksize=TRADES_CHUNK_SIZE):
+    """Read the trades csv in chunks of compactly typed rows, so that very
+    large files never have to be held in memory at once"""
+    path = make_path('trades', '')
+
+    chunks = pd.read_csv(path,
+                         parse_dates=['Date'],
+                         dtype=trades_dtypes(path),
+                         chunksize=chunksize)
+
+    for chunk in chunks:
+        instrument.count('trade_rows', len(chunk))
+
+        # Drop rows where any column is empty
+        yield chunk.dropna(axis=0)
+
+
+def write_atomic(path, text):
+    """Write text to path, replacing the file only once it is fully written"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', newline='') as handle:
+        handle.write(text)
+    os.replace(temp_path, path)
+
+
+def append_csv_rows(path, rows, keep):
+    """Atomically append CSV rows (without a header) to path, after dropping
+    all but the first `keep` data rows already stored"""
+    with open(path, newline='') as handle:
+        lines = handle.readlines()
+
+    # Keep the header line plus the requested data rows
+    write_atomic(path, ''.join(lines[:keep + 1]) + rows)
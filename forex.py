@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pandas as pd
+import cache
+import file
+import instrument
+import store
+
+BASE_CURRENCY = 'USD'
+FOREX_DIRECTORY = 'forex'
+
+
+def available_pairs():
+    """Return the names (e.g. AUDUSD) of all stored currency pairs"""
+    directory = os.path.join(file.DATA_DIRECTORY, FOREX_DIRECTORY)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return set()
+    return {os.path.splitext(name)[0] for name in names
+            if name.endswith(('.csv', '.feather'))}
+
+
+def pair_paths(pairs):
+    return [file.make_path(pair, FOREX_DIRECTORY) for pair in sorted(pairs)]
+
+
+def read_pair(pair):
+    """Return the stored closes for a pair, sorted by date"""
+    closes = store.read_frame(pair, FOREX_DIRECTORY, columns=['Close'])['Close']
+    closes = closes[~closes.index.duplicated(keep='last')]
+    return closes.sort_index().dropna()
+
+
+def read_conversion(source, target, pairs):
+    """Return the rate to convert source into target, from the direct pair or
+    the inverse of the opposite pair, or None if neither is stored"""
+    if source + target in pairs:
+        return read_pair(source + target)
+    if target + source in pairs:
+        return 1 / read_pair(target + source)
+    return None
+
+
+def read_rate(currency, base, pairs):
+    """Return the rate to convert currency into base, triangulating through
+    another currency when there is no pair between them"""
+    rate = read_conversion(currency, base, pairs)
+    if rate is not None:
+        return rate
+
+    # Try each currency that has a pair with both sides
+    others = {pair[:3] for pair in pairs} | {pair[3:] for pair in pairs}
+    for other in sorted(others - {currency, base}):
+        first = read_conversion(currency, other, pairs)
+        if first is None:
+            continue
+        second = read_conversion(other, base, pairs)
+        if second is None:
+            continue
+
+        # Combine as of each date either rate changed
+        dates = first.index.union(second.index)
+        combined = first.reindex(dates).ffill() * second.reindex(dates).ffill()
+        return combined.dropna()
+
+    raise FileNotFoundError(f'No forex data to convert {currency} to {base}')
+
+
+def build_rate_matrix(currencies, base=BASE_CURRENCY):
+    """Return a dense (date x currency) matrix of rates into base over the
+    union of all the stored dates, carrying each rate forward to dates it
+    wasn't quoted on"""
+    pairs = available_pairs()
+    rates = {}
+    for currency in currencies:
+        if currency != base:
+            rates[currency] = read_rate(currency, base, pairs)
+
+    if rates:
+        matrix = pd.concat(rates, axis=1).sort_index().ffill()
+    else:
+        matrix = pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+
+    if base in currencies:
+        matrix[base] = 1.0
+
+    return matrix[list(currencies)]
+
+
+def get_rate_matrix(currencies, base=BASE_CURRENCY):
+    """Return the rate matrix for the currencies, cached until any of the
+    stored forex files change"""
+    return cache.cached(f'forex/{base}', currencies, None,
+                        pair_paths(available_pairs()),
+                        lambda: build_rate_matrix(currencies, base))
+
+
+def rates_asof(matrix, dates, base=BASE_CURRENCY):
+    """Return the rates in effect on each of the dates: the latest rate on or
+    before the date. Dates before the first quote have no rate, except for
+    the base currency which is always 1."""
+    dates = pd.DatetimeIndex(dates)
+    rows = matrix.index.searchsorted(dates.values, side='right') - 1
+
+    values = np.full((dates.size, matrix.columns.size), np.nan)
+    if matrix.index.size:
+        values[rows >= 0] = matrix.values[rows[rows >= 0]]
+
+    rates = pd.DataFrame(values, index=dates, columns=matrix.columns)
+    if base in rates.columns:
+        rates[base] = 1.0
+
+    return rates
+
+
+@instrument.timed('construct_forex')
+def get_rates(currencies, dates, base=BASE_CURRENCY):
+    """Return a (date x currency) frame of the rates to convert each currency
+    into base on the given dates"""
+    return rates_asof(get_rate_matrix(currencies, base), dates, base)
+
+
+def convert(values, dates, currencies, matrix, base=BASE_CURRENCY):
+    """Convert values into the base currency in one vectorized broadcast.
+
+    Values, dates and currencies are equal length arrays (e.g. the Price, Date
+    and Currency columns of the trades)."""
+    rates = rates_asof(matrix, dates, base)
+    columns = matrix.columns.get_indexer(np.asarray(currencies, dtype=object))
+
+    converted = np.asarray(values, dtype=float) * \
+        rates.values[np.arange(len(columns)), columns]
+    converted[columns < 0] = np.nan
+
+    return converted
@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+import benchmark
+import instrument
+
+
+def trade_signs(trades):
+    """Return +1 for buy trades and -1 for everything else"""
+    return np.where(trades['Type'] == 'Buy', 1, -1)
+
+
+def trade_rows(trades, index):
+    """Return the row of the index each trade first applies to.
+
+    Equivalent to label slicing `series.loc[trade['Date']:]` on a sorted index,
+    so trades on non-trading days apply from the next available date."""
+    return index.searchsorted(pd.DatetimeIndex(trades['Date']).values,
+                              side='left')
+
+
+def in_range(trades, rows, size):
+    """Return the trades and their rows without the trades dated after the
+    last of size rows, which never show up in the index"""
+    keep = rows < size
+    if keep.all():
+        return trades, rows
+    return trades[keep], rows[keep]
+
+
+def factorize_keys(keys, columns):
+    """Return (codes, labels) for the unique value combinations of columns in
+    the keys frame, with the labels named after the columns"""
+    if len(columns) == 1:
+        codes, labels = pd.factorize(keys[columns[0]])
+        return codes, pd.Index(labels, name=columns[0])
+    codes, labels = pd.MultiIndex.from_frame(keys).factorize()
+    return codes, labels.set_names(columns)
+
+
+def as_chunks(trades):
+    """Accept either a trades dataframe or an iterable of trades chunks (e.g.
+    from file.iter_trades_csv)"""
+    if isinstance(trades, pd.DataFrame):
+        return [trades]
+    return trades
+
+
+def get_position_changes(trades, index, columns, quantity='Shares'):
+    """Return a (date x column) dataframe of the net signed quantity traded
+    on each date.
+
+    `columns` is a list of trades columns (e.g. ['Symbol']) whose unique value
+    combinations become the columns of the result."""
+    trades, rows = in_range(trades, trade_rows(trades, index), index.size)
+    quantities = trade_signs(trades) * trades[quantity].values.astype(float)
+
+    # Categorical columns (from compact reads) become plain labels, so chunks
+    # with different categories line up
+    codes, labels = factorize_keys(trades[columns].astype(object), columns)
+
+    # Scatter each trade into its (date, column) cell
+    changes = np.zeros((index.size, len(labels)))
+    np.add.at(changes, (rows, codes), quantities)
+
+    return pd.DataFrame(changes, index=index, columns=labels)
+
+
+def add_changes(total, changes):
+    if total is None:
+        return changes
+    return total.add(changes, fill_value=0)
+
+
+def no_changes(index, columns):
+    """Return an empty matrix of position changes with the column levels of
+    get_position_changes, for when there are no trades at all"""
+    if len(columns) == 1:
+        labels = pd.Index([], name=columns[0])
+    else:
+        labels = pd.MultiIndex.from_arrays([[]] * len(columns), names=columns)
+    return pd.DataFrame(np.zeros((index.size, 0)), index=index, columns=labels)
+
+
+def carry_forward(changes, index):
+    """Turn a matrix of position changes into cumulative positions"""
+    return pd.DataFrame(np.cumsum(changes.values, axis=0),
+                        index=changes.index, columns=changes.columns)
+
+
+def get_positions(trades, index, columns, quantity='Shares'):
+    """Return a (date x column) dataframe of cumulative signed quantities.
+
+    Trades may be given in chunks, in which case only the position matrix is
+    held in memory rather than the whole ledger."""
+    changes = None
+    for chunk in as_chunks(trades):
+        changes = add_changes(
+            changes, get_position_changes(chunk, index, columns, quantity))
+
+    if changes is None:
+        changes = no_changes(index, columns)
+
+    return carry_forward(changes, index)
+
+
+def value_positions(positions, *factors):
+    """Multiply each position column by its matching price/forex columns and
+    sum across columns to give a value for each date"""
+    values = positions.values.copy()
+
+    for factor, labels in factors:
+        values *= factor.reindex(index=positions.index, columns=labels).values
+
+    # Dates before a position is opened have no value, even when the price or
+    # forex rate on that date is missing
+    values[positions.values == 0] = 0
+
+    return pd.Series(values.sum(axis=1), index=positions.index)
+
+
+def apply_exchange(trades, exchange=''):
+    """Return the trades with symbols suffixed to match the price columns"""
+    if exchange == 'ASX':
+        trades = trades.assign(Symbol=trades['Symbol'].astype(str) + '.XASX')
+    return trades
+
+
+def priced_trades(trades, prices, exchange=''):
+    """Yield each chunk of trades for symbols with price data"""
+    for chunk in as_chunks(trades):
+        chunk = apply_exchange(chunk, exchange)
+
+        # Skip any stocks with no price data
+        yield chunk[chunk['Symbol'].isin(prices.columns)]
+
+
+def value_held(positions, price_values):
+    """Value (account x date x symbol) positions against a (date x symbol)
+    price matrix, giving a (date x account) array. Positions held on a date
+    with no price have no value; empty positions are never affected.
+
+    Missing prices are zeroed in place, so price_values should be a copy
+    (e.g. a selection of columns) that isn't needed afterwards."""
+    missing = np.isnan(price_values)
+    gaps = np.flatnonzero(missing.any(axis=0))
+    price_values[missing] = 0
+    values = np.einsum('ads,ds->da', positions, price_values, optimize=True)
+
+    # Only the symbols with a missing price need checking
+    if gaps.size:
+        held_missing = np.einsum('ads,ds->da', positions[:, :, gaps] != 0,
+                                 missing[:, gaps])
+        values[held_missing] = np.nan
+
+    return values
+
+
+def grow(changes, size):
+    """Return an (account x date x symbol) changes tensor with room for at
+    least size symbols, doubling it so that repeated growth stays linear"""
+    grown = np.zeros(changes.shape[:2] + (max(size, 2 * changes.shape[2]),))
+    grown[:, :, :changes.shape[2]] = changes
+    return grown
+
+
+@instrument.timed('value_accounts')
+def get_account_values(trades, prices, num_accounts, benchmark_symbol=None):
+    """Value many portfolios at once against one shared price matrix.
+
+    Trades (a dataframe or an iterable of chunks) must only hold symbols in
+    the price columns, and carry an integer Account column from 0 up to
+    num_accounts. Each chunk's signed quantities are scattered into an
+    (account x date x symbol) tensor as it arrives, so only the tensor is held
+    rather than the ledger. The tensor is then carried forward and multiplied
+    against the prices in one pass. It only has a column for each symbol the
+    accounts trade, added as they first appear, so its size doesn't grow with
+    the rest of the price universe.
+
+    Returns (date x account) arrays of the portfolio and benchmark values. The
+    benchmark values (from the benchmark.py engine) are None when there is no
+    benchmark symbol."""
+    index = prices.index
+    if benchmark_symbol is not None:
+        _, legs, membership = benchmark.get_legs(benchmark_symbol)
+        bm_changes = np.zeros((num_accounts, index.size, len(legs)))
+
+    # The tensor slot of each price column, and the price column of each slot
+    slots = np.full(prices.columns.size, -1, dtype=np.int64)
+    held = []
+    changes = np.zeros((num_accounts, index.size, 0))
+
+    for chunk in as_chunks(trades):
+        chunk, rows = in_range(chunk, trade_rows(chunk, index), index.size)
+
+        # Symbols traded for the first time take the next slots
+        columns = prices.columns.get_indexer(chunk['Symbol'].astype(object))
+        new = np.unique(columns[slots[columns] < 0])
+        slots[new] = np.arange(len(held), len(held) + new.size)
+        held.extend(new)
+        if len(held) > changes.shape[2]:
+            changes = grow(changes, len(held))
+
+        accounts = chunk['Account'].values
+        np.add.at(changes, (accounts, rows, slots[columns]),
+                  trade_signs(chunk) * chunk['Shares'].values.astype(float))
+
+        if benchmark_symbol is not None:
+            benchmark.add_units(bm_changes, chunk, rows, prices, legs,
+                                accounts)
+
+    # Carry each trade forward
+    held = np.array(held, dtype=np.int64)
+    positions = changes[:, :, :held.size]
+    np.cumsum(positions, axis=1, out=positions)
+    values = value_held(positions, prices.values[:, held])
+
+    if benchmark_symbol is None:
+        return values, None
+
+    bm_values = benchmark.value_units(bm_changes, prices, legs, membership)
+
+    return values, bm_values[:, :, 0].T
+
+
+@instrument.timed('value_portfolio')
+def get_portfolio_value_over_time(trades, prices, exchange='', benchmark_symbol=None):
+    """Vectorized equivalent of the per-trade portfolio valuation loop.
+
+    Signed share quantities are pivoted into a (date x symbol) matrix, summed
+    cumulatively and multiplied by the price matrix in a single pass. This is
+    the single account case of get_account_values. When a benchmark symbol is
+    given, a Benchmark column values the same cash flows as units of the
+    benchmark bought and sold on each trade date.
+
+    Trades may be a dataframe or an iterable of chunks."""
+    trades = (chunk.assign(Account=0)
+              for chunk in priced_trades(trades, prices, exchange))
+    values, bm_values = get_account_values(trades, prices, 1, benchmark_symbol)
+
+    holdings = pd.DataFrame(index=prices.index.values)
+    holdings['Portfolio'] = values[:, 0]
+
+    if bm_values is not None:
+        holdings['Benchmark'] = bm_values[:, 0]
+
+    return holdings
+
+
+@instrument.timed('value_converted')
+def get_converted_value_over_time(trades, prices, forex, quantity='Quantity'):
+    """Vectorized portfolio valuation with each trade converted from its own
+    currency using the forex matrix. Trades may be a dataframe or an iterable
+    of chunks."""
+    index = prices.index
+
+    positions = get_positions(priced_trades(trades, prices), index,
+                              ['Symbol', 'Currency'], quantity=quantity)
+    symbols = positions.columns.get_level_values('Symbol')
+    currencies = positions.columns.get_level_values('Currency')
+    value = value_positions(positions, (prices, symbols), (forex, currencies))
+
+    holdings = pd.DataFrame(index=index.values)
+    holdings['Portfolio'] = value.round(2).values
+
+    return holdings
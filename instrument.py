@@ -0,0 +1,178 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Set PORTFOLIO_PROFILE to a file path to record spans and counters for a run
+# and write them there on exit, as a summary ('json') or a trace that can be
+# opened in chrome://tracing or Perfetto ('chrome'). When it isn't set every
+# call here returns straight away.
+PROFILE_PATH = os.environ.get('PORTFOLIO_PROFILE', '')
+PROFILE_FORMAT = os.environ.get('PORTFOLIO_PROFILE_FORMAT', 'json')
+
+ENABLED = bool(PROFILE_PATH)
+
+# Shared do-nothing context returned by span() when disabled
+NO_SPAN = nullcontext()
+
+lock = threading.Lock()
+events = []
+counters = {}
+started = time.perf_counter_ns()
+
+
+def enable(path=None, format=None):
+    """Start recording, e.g. from a benchmark, instead of through the
+    environment"""
+    global ENABLED, PROFILE_PATH, PROFILE_FORMAT
+    ENABLED = True
+    if path is not None:
+        PROFILE_PATH = path
+    if format is not None:
+        PROFILE_FORMAT = format
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    global started
+    with lock:
+        events.clear()
+        counters.clear()
+        started = time.perf_counter_ns()
+
+
+def peak_memory():
+    """Return the peak resident memory of the process in bytes, or None if it
+    can't be measured on this platform"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span:
+    """Times a named stage, with any args (e.g. the symbol) kept alongside"""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        events.append({
+            'name': self.name,
+            'start': self.start - started,
+            'duration': end - self.start,
+            'thread': threading.get_ident(),
+            'peak_memory': peak_memory(),
+            'args': self.args,
+        })
+        return False
+
+
+def span(name, **args):
+    """Return a context manager timing the stage called name. Spans in worker
+    processes are not collected."""
+    if not ENABLED:
+        return NO_SPAN
+    return Span(name, args)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a span"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1):
+    """Add amount to a counter, e.g. rows parsed or bytes downloaded"""
+    if not ENABLED:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def summary():
+    """Return the calls, total and longest time (in seconds) of each span
+    name, the counters and the peak memory"""
+    spans = {}
+    for event in list(events):
+        stats = spans.setdefault(event['name'],
+                                 {'calls': 0, 'total': 0.0, 'max': 0.0})
+        seconds = event['duration'] / 1e9
+        stats['calls'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+
+    return {'spans': spans, 'counters': dict(counters),
+            'peak_memory': peak_memory()}
+
+
+def chrome_trace():
+    """Return the events in the Chrome trace event format"""
+    pid = os.getpid()
+    trace = []
+    for event in list(events):
+        args = dict(event['args'])
+        if event['peak_memory'] is not None:
+            args['peak_memory'] = event['peak_memory']
+        trace.append({'name': event['name'], 'ph': 'X', 'pid': pid,
+                      'tid': event['thread'], 'ts': event['start'] / 1000,
+                      'dur': event['duration'] / 1000, 'args': args})
+
+    # Counters are shown as their final values at the end of the trace
+    end = (time.perf_counter_ns() - started) / 1000
+    for name, value in counters.items():
+        trace.append({'name': name, 'ph': 'C', 'pid': pid, 'tid': 0,
+                      'ts': end, 'args': {name: value}})
+
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+
+def write(path=None, format=None):
+    """Write what has been recorded to path"""
+    path = PROFILE_PATH if path is None else path
+    format = PROFILE_FORMAT if format is None else format
+
+    if format == 'chrome':
+        output = chrome_trace()
+    else:
+        output = summary()
+        output['events'] = list(events)
+
+    with open(path, 'w') as handle:
+        json.dump(output, handle, indent=1, default=str)
+
+
+def write_on_exit():
+    if ENABLED and PROFILE_PATH:
+        write()
+
+
+atexit.register(write_on_exit)
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import holdings
+
+# Net positions smaller than this fraction of the quantity traded so far are
+# treated as fully sold. Quantities are read as float32 (about 7 significant
+# digits), so e.g. buying 0.1 and 0.2 then selling 0.3 leaves about 7e-9.
+POSITION_TOLERANCE = 1e-6
+
+
+class TradeIndex:
+    """Trades grouped by symbol, currency or any other column.
+
+    The trades are sorted by date once, and each column is grouped on first
+    use by a single factorize and stable sort, so every group's trades are a
+    contiguous, date ordered slice. Per-group first and last trade dates,
+    trade counts and net positions then come straight from the slice bounds,
+    rather than from a boolean scan of the whole ledger for every symbol."""
+
+    def __init__(self, trades, quantity=None):
+        if quantity is None:
+            quantity = 'Quantity' if 'Quantity' in trades.columns else 'Shares'
+
+        order = np.argsort(trades['Date'].values, kind='stable')
+        self.trades = trades.iloc[order].reset_index(drop=True)
+        self.quantity = quantity
+        self.signed = holdings.trade_signs(self.trades) * \
+            self.trades[quantity].values.astype(float)
+        self.groups = {}
+        self.summaries = {}
+
+    def group(self, column):
+        """Return (labels, order, offsets) for column: the trades of
+        labels[i] are at order[offsets[i]:offsets[i + 1]]"""
+        if column not in self.groups:
+            codes, labels = pd.factorize(self.trades[column].astype(object))
+            order = np.argsort(codes, kind='stable')
+            offsets = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.groups[column] = (pd.Index(labels, name=column), order,
+                                   offsets)
+        return self.groups[column]
+
+    def keys(self, column='Symbol'):
+        """Return the distinct values of column, in order of first trade"""
+        return self.group(column)[0]
+
+    def summary(self, column='Symbol'):
+        """Return a frame indexed by the values of column with the First and
+        Last trade dates, number of Trades and Net signed quantity"""
+        if column in self.summaries:
+            return self.summaries[column]
+
+        labels, order, offsets = self.group(column)
+        dates = self.trades['Date'].values[order]
+        counts = np.diff(offsets)
+
+        summary = pd.DataFrame(index=labels)
+        summary['First'] = dates[offsets[:-1]] if len(labels) else dates[:0]
+        summary['Last'] = dates[offsets[1:] - 1] if len(labels) else dates[:0]
+        summary['Trades'] = counts
+        summary['Net'] = np.add.reduceat(self.signed[order], offsets[:-1]) \
+            if len(labels) else np.zeros(0)
+
+        self.summaries[column] = summary
+        return summary
+
+    def slice(self, key, column='Symbol'):
+        """Return the trades for one value of column, in date order"""
+        labels, order, offsets = self.group(column)
+        position = labels.get_loc(key)
+        return self.trades.iloc[order[offsets[position]:offsets[position + 1]]]
+
+    def slices(self, column='Symbol'):
+        """Yield (value, trades) for every value of column"""
+        labels, order, offsets = self.group(column)
+        for position, key in enumerate(labels):
+            yield key, self.trades.iloc[
+                order[offsets[position]:offsets[position + 1]]]
+
+    def holding_intervals(self, column='Symbol'):
+        """Return a frame with a row for each period a position was held:
+        the value of column, the Start date of the trade that opened it and
+        the End date of the trade that closed it (NaT while still held)."""
+        labels, order, offsets = self.group(column)
+        dates = self.trades['Date'].values[order]
+        codes = np.repeat(np.arange(len(labels)), np.diff(offsets))
+
+        # Running position, and quantity traded, within each group after each
+        # trade. Summed per group, so other groups' totals add no rounding.
+        signed = pd.Series(self.signed[order])
+        positions = signed.groupby(codes).cumsum().values
+        traded = signed.abs().groupby(codes).cumsum().values
+
+        # Only the position at the end of each day matters, so buying back on
+        # the day of a sale doesn't split the interval
+        last = np.ones(codes.size, dtype=bool)
+        last[:-1] = (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1])
+        codes, dates = codes[last], dates[last]
+        positions, traded = positions[last], traded[last]
+
+        held = np.abs(positions) > POSITION_TOLERANCE * traded
+        was_held = np.zeros_like(held)
+        was_held[1:] = held[:-1] & (codes[1:] == codes[:-1])
+
+        opens = np.flatnonzero(held & ~was_held)
+        closes = np.flatnonzero(~held & was_held)
+
+        # Opens and closes alternate within a group, so each open is closed
+        # by the next close if it is in the same group
+        ends = np.full(opens.size, np.datetime64('NaT'), dtype=dates.dtype)
+        following = np.searchsorted(closes, opens)
+        has_close = following < closes.size
+        closed = np.zeros(opens.size, dtype=bool)
+        closed[has_close] = codes[closes[following[has_close]]] == \
+            codes[opens[has_close]]
+        ends[closed] = dates[closes[following[closed]]]
+
+        return pd.DataFrame({column: labels.take(codes[opens]),
+                             'Start': dates[opens], 'End': ends})
+
+    def holding_spans(self, column='Symbol'):
+        """Return a frame indexed by the values of column with the Start of
+        the first holding interval and End of the last (NaT while still
+        held). Values never held are left out."""
+        intervals = self.holding_intervals(column)
+
+        # Intervals are in date order within each value
+        first = intervals.drop_duplicates(column, keep='first')
+        last = intervals.drop_duplicates(column, keep='last')
+
+        spans = pd.DataFrame(index=pd.Index(first[column].values, name=column))
+        spans['Start'] = first['Start'].values
+        spans['End'] = last['End'].values
+        return spans
+
+    def grouped_spans(self, by, column='Symbol'):
+        """Return the holding spans of the values of column combined by
+        another column, e.g. the span each currency was needed for. Values of
+        by that are still held have no End."""
+        spans = self.holding_spans(column)
+        keys = self.trades.drop_duplicates(column).set_index(column)[by]
+        spans[by] = keys.astype(object).reindex(spans.index).values
+
+        # NaT sorts as the latest end, so any open position keeps it open
+        latest = pd.Timestamp.max.floor('D')
+        spans['End'] = spans['End'].fillna(latest)
+        grouped = spans.groupby(by, sort=False).agg(
+            Start=('Start', 'min'), End=('End', 'max'))
+        grouped['End'] = grouped['End'].where(grouped['End'] != latest)
+        return grouped
+
+    def first_date(self, key, column='Symbol'):
+        return self.summary(column).at[key, 'First']
+
+    def last_date(self, key, column='Symbol'):
+        return self.summary(column).at[key, 'Last']
+
+    def net_position(self, key, column='Symbol'):
+        return self.summary(column).at[key, 'Net']
+
+
+def held_between(intervals, start=None, end=None):
+    """Return the holding intervals that overlap the dates from start to end,
+    clipped to them"""
+    keep = np.ones(len(intervals), dtype=bool)
+    if end is not None:
+        keep &= (intervals['Start'] <= end).values
+    if start is not None:
+        keep &= (intervals['End'].isna() | (intervals['End'] >= start)).values
+
+    intervals = intervals[keep].copy()
+    if start is not None:
+        intervals['Start'] = intervals['Start'].clip(lower=start)
+    if end is not None:
+        intervals['End'] = intervals['End'].fillna(end).clip(upper=end)
+    return intervals
+
+
+def as_index(trades):
+    """Accept either a trades dataframe or an existing TradeIndex"""
+    return trades if isinstance(trades, TradeIndex) else TradeIndex(trades)
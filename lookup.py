@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+def to_int64(dates):
+    """Return dates as sorted-comparable int64 nanoseconds"""
+    return pd.DatetimeIndex(dates).as_unit('ns').asi8
+
+
+def asof_positions(keys, dates):
+    """Return the position of the latest key on or before each date, or -1
+    for dates before the first key"""
+    return np.searchsorted(keys, to_int64(dates), side='right') - 1
+
+
+class PriceIndex:
+    """As-of price lookups for many symbols.
+
+    Each symbol's quotes are kept as a sorted int64 date array and a matching
+    value array, so the price in effect on any date (including weekends and
+    exchange holidays) is found with a binary search, in O(log n) per date and
+    vectorized over batches of dates."""
+
+    def __init__(self, quotes):
+        # Dict of symbol to (int64 dates, float values), sorted by date
+        self.quotes = quotes
+
+    @classmethod
+    def from_series(cls, series_by_symbol):
+        """Build the index from a dict of symbol to a date indexed series.
+        Missing values are not treated as quotes."""
+        quotes = {}
+        for symbol, series in series_by_symbol.items():
+            series = series.dropna().sort_index()
+            series = series[~series.index.duplicated(keep='last')]
+            quotes[symbol] = (to_int64(series.index),
+                              series.values.astype(float))
+        return cls(quotes)
+
+    @classmethod
+    def from_frame(cls, prices, missing_value=0):
+        """Build the index from a (date x symbol) price matrix. Prices equal to
+        missing_value (the fill value the price loaders use) are treated as
+        missing."""
+        prices = prices.replace(missing_value, np.nan) \
+            if missing_value is not None else prices
+        return cls.from_series({symbol: prices[symbol]
+                                for symbol in prices.columns})
+
+    def __contains__(self, symbol):
+        return symbol in self.quotes
+
+    def asof(self, symbol, dates):
+        """Return the price of symbol in effect on each date, NaN before its
+        first quote"""
+        keys, values = self.quotes[symbol]
+        positions = asof_positions(keys, dates)
+
+        prices = np.full(positions.size, np.nan)
+        found = positions >= 0
+        prices[found] = values[positions[found]]
+        return prices
+
+    def asof_pairs(self, symbols, dates):
+        """Return the price in effect for each (symbol, date) pair, e.g. for
+        every trade in a ledger. Symbols with no quotes give NaN."""
+        symbols = np.asarray(symbols, dtype=object)
+        dates = to_int64(dates)
+        prices = np.full(symbols.size, np.nan)
+
+        # Group the pairs by symbol with one stable sort, so each symbol's
+        # dates are a contiguous slice rather than a scan of every pair
+        codes, uniques = pd.factorize(symbols)
+        order = np.argsort(codes, kind='stable')
+        offsets = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+        for code, symbol in enumerate(uniques):
+            if symbol not in self.quotes:
+                continue
+            rows = order[offsets[code]:offsets[code + 1]]
+            keys, values = self.quotes[symbol]
+            positions = np.searchsorted(keys, dates[rows], side='right') - 1
+            found = positions >= 0
+            prices[rows[found]] = values[positions[found]]
+
+        return prices
+
+    def matrix(self, dates, symbols=None):
+        """Return a (date x symbol) frame of the prices in effect on each date,
+        e.g. to value a portfolio daily from monthly or irregular quotes"""
+        symbols = list(self.quotes) if symbols is None else list(symbols)
+        dates = pd.DatetimeIndex(dates)
+        values = np.column_stack(
+            [self.asof(symbol, dates) if symbol in self.quotes
+             else np.full(dates.size, np.nan) for symbol in symbols]) \
+            if symbols else np.zeros((dates.size, 0))
+        return pd.DataFrame(values, index=dates, columns=symbols)
+
+
+def asof(series, dates):
+    """Return the value of a date indexed series in effect on each date"""
+    return PriceIndex.from_series({None: series}).asof(None, dates)
+
+
+def asof_frame(frame, dates):
+    """Return the values of each column of a date indexed frame in effect on
+    each date"""
+    index = PriceIndex.from_series({column: frame[column]
+                                    for column in frame.columns})
+    return index.matrix(dates, frame.columns)
@@ -1,24 +1,18 @@
-from alpha_vantage.timeseries import TimeSeries
-import csv
-import os
-import file
+import datetime
+import providers
 
 
-def fetch_csv(ticker):
-    ts = TimeSeries(
-        key=os.environ['ALPHA_VANTAGE_API_KEY'], output_format='csv')
-    data_csv, _ = ts.get_daily(ticker, outputsize='compact')
-    return data_csv
+def main():
+    # A start date within the last 100 trading days only asks Alpha Vantage
+    # for its compact response
+    today = datetime.date.today()
+    start_date = today - datetime.timedelta(days=130)
 
+    # Alpha Vantage's 5 requests a minute are part of its provider budget
+    providers.refresh(['MQG.AX'], start_date.strftime("%Y-%m-%d"),
+                      today.strftime("%Y-%m-%d"),
+                      providers=[providers.AlphaVantageProvider()])
 
-def write_to_file(content, ticker):
-    path = file.make_path(ticker)
-    with open(path, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        for row in content:
-            writer.writerow(row)
 
-
-ticker = 'MQG.AX'
-csv_data = fetch_csv(ticker)
-write_to_file(csv_data, ticker)
+if __name__ == "__main__":
+    main()
@@ -5,49 +5,36 @@
 #        'CPU', 'OFX', 'VRT', 'VTS', 'VAS', 'RFG']
 # http://ichart.finance.yahoo.com/table.csv?d=6&e=1&f=2009&g=d&a=7&b=19&c=2004&ignore=.csv&s=
 
-import requests
-import file
-import os
+import providers
 
+# Dates of the stored Xignite histories
+START_DATE = '2016-07-16'
+END_DATE = '2017-07-14'
 
-def make_url(ticker_symbol):
-    API_KEY = os.environ['XIGNITE_API_KEY']
-    base_url = f"https://www.xignite.com/xGlobalHistorical.csv/GetGlobalHistoricalQuotesRange?_token={API_KEY}&StartDate=7/16/2016&EndDate=7/14/2017&IdentifierType=Symbol&AdjustmentMethod=SplitAndProportionalCashDividend&Identifier="
-    return base_url + ticker_symbol
-
-
-def pull_historical_data(ticker_symbol):
-    """Takes a Yahoo Finance ticker symbol and returns the historical data for
-        it as a compressed requests session"""
-    with requests.Session() as s:
-        url = make_url(ticker_symbol)
-        return s.get(url)
-
-
-def write_to_file(content, ticker_symbol):
-    path = file.make_path(ticker_symbol)
-    with open(path, 'wb') as handle:
-        for block in content.iter_content(1024):
-            handle.write(block)
 
+def download_all_hist_data(ticker_symbols, exchange='ASX'):
+    """Fetch the closes of all symbols concurrently from Xignite, failing
+    over to Yahoo Finance, and store them under their Xignite symbols.
+    Returns a dict of symbol to each provider's error for any symbols that
+    couldn't be fetched."""
+    symbols = [symbol + '.XASX' if exchange == 'ASX' else symbol
+               for symbol in ticker_symbols]
 
-def download_hist_data_csv(ticker_symbol, exchange=''):
-    if exchange is 'ASX':
-        ticker_symbol += '.XASX'
-    response = pull_historical_data(ticker_symbol)
-    write_to_file(response, ticker_symbol)
+    # Xignite's rate limit and concurrency are part of its provider budget
+    return providers.refresh(symbols, START_DATE, END_DATE, providers=[
+        providers.XigniteProvider(), providers.YFinanceProvider('1d')])
 
 
-def download_all_hist_data(ticker_symbols, exchange='ASX'):
-    for symbol in ticker_symbols:
-        download_hist_data_csv(symbol, exchange)
+def main():
+    download_all_hist_data([
+        'BHP', 'MQG', 'VOC', 'AMM', 'MTS', 'CTD', 'IRI', 'CDA', 'CLH',
+        'RCG', 'COH', 'SIV', 'NHF', 'SOL', 'IMF', 'CBA', 'NAB', 'ABC',
+        'DMG', 'PMV', 'CCV', 'RMD', 'TLS', 'WEB', 'MTU', 'GBT', 'SYD',
+        'TFC', 'CGF', 'FXL', 'GRB', 'CCL', 'TRS', 'PBG', 'CAR', 'MNF',
+        'CPU', 'OFX', 'VRT', 'VTS', 'VAS', 'RFG'])
 
+    # download_all_hist_data(['BHP'])
 
-download_all_hist_data([
-    'BHP', 'MQG', 'VOC', 'AMM', 'MTS', 'CTD', 'IRI', 'CDA', 'CLH',
-    'RCG', 'COH', 'SIV', 'NHF', 'SOL', 'IMF', 'CBA', 'NAB', 'ABC',
-    'DMG', 'PMV', 'CCV', 'RMD', 'TLS', 'WEB', 'MTU', 'GBT', 'SYD',
-    'TFC', 'CGF', 'FXL', 'GRB', 'CCL', 'TRS', 'PBG', 'CAR', 'MNF',
-    'CPU', 'OFX', 'VRT', 'VTS', 'VAS', 'RFG'])
 
-# download_all_hist_data(['BHP'])
+if __name__ == "__main__":
+    main()
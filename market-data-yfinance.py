@@ -1,70 +1,232 @@
-import yfinance as yf
 import pandas as pd
+import numpy as np
 import os
+import sys
 import datetime
 import csv
 import file
+import ledger
+import providers
+import warehouse
 
 BASE_CURRENCY = "USD"
 
+# Relative difference in a stored close that means the history has since been
+# adjusted for a split or dividend
+ADJUSTMENT_TOLERANCE = 1e-6
 
-def download_historic_prices(trades):
-    # Get symbols of all stocks traded
-    symbols = trades.Symbol.unique().tolist()
+# Bar size of the stored histories, and the most tickers in one request
+INTERVAL = "1mo"
+BATCH_SIZE = 100
 
-    for symbol in symbols:
-        symbol_trades = trades.loc[trades['Symbol'] == symbol]
 
-        start_date = symbol_trades['Date'].min().strftime("%Y-%m-%d")
-        # TODO: Fetch last traded date, if all sold, otherwise today's date
-        today = datetime.date.today().strftime("%Y-%m-%d")
+def fetch_batch(tickers, start_date, end_date, interval=INTERVAL):
+    """Download closes for many tickers in one Yahoo Finance request. Returns a
+    dict of ticker to its closes."""
+    # TODO: Handle dates when stock isn't traded on the first of the month
+    return providers.YFinanceProvider(interval).fetch_batch(
+        tickers, start_date, end_date)
 
-        # Download the historic prices from Yahoo Finance
-        # TODO: Handle dates when stock isn't traded on the first of the month
-        prices = yf.Ticker(symbol).history(
-            start=start_date, end=today, interval="1mo")[['Close']]
 
-        # Drop all corporate actions (for simplicity). Later we can separate these out into
-        # their own files and use them to calculate portfolio performance
-        prices = prices.dropna()
+def batch_start(start_date, interval=INTERVAL):
+    """Return the start date used to group a fetch into a batch. Monthly bars
+    always start on the first of the month."""
+    if interval == '1mo':
+        return start_date[:7] + '-01'
+    return start_date
 
-        # If historic prices exist, write them to a CSV file
-        if not prices.empty:
-            output_file = file.make_path(symbol)
-            prices.to_csv(output_file)
 
+def fetch_grouped(jobs, interval=INTERVAL):
+    """Download the closes for (ticker, start date, end date) jobs, grouping
+    tickers with the same dates into batched requests"""
+    groups = {}
+    for ticker, start_date, end_date in jobs:
+        key = (batch_start(start_date, interval), end_date)
+        groups.setdefault(key, []).append(ticker)
 
-def download_forex(trades):
-    # Get the currencies of all stocks traded
-    currencies = trades.Currency.unique().tolist()
+    histories = {}
+    for (start_date, end_date), tickers in sorted(groups.items()):
+        for i in range(0, len(tickers), BATCH_SIZE):
+            histories.update(fetch_batch(tickers[i:i + BATCH_SIZE], start_date,
+                                         end_date, interval))
 
-    for currency in currencies:
-        # No need to fetch the base currency (no conversion needed)
-        if currency == BASE_CURRENCY:
-            continue
+    return histories
+
+
+def date_keys(df):
+    return df.index.strftime("%Y-%m-%d")
+
+
+def read_stored_closes(path):
+    """Return the closes already stored at path, keyed by date, or None if
+    nothing has been stored yet"""
+    try:
+        stored = pd.read_csv(path, usecols=['Date', 'Close'],
+                             dtype={'Date': str})
+    except FileNotFoundError:
+        return None
+
+    return pd.Series(stored['Close'].values, index=stored['Date'].str[:10])
+
+
+def plan_fetch(path, start_date, incremental=True):
+    """Return the date to fetch a history from and the closes already stored.
+
+    In incremental mode the second last stored row is fetched again: the last
+    row may be a partial period that needs replacing, and comparing the one
+    before it shows whether earlier closes have been adjusted."""
+    stored = read_stored_closes(path) if incremental else None
 
-        currency_trades = trades.loc[trades['Currency'] == currency]
+    # Trades earlier than the stored history need the full history again
+    if stored is None or len(stored) < 2 or stored.index[0][:7] > start_date[:7]:
+        return start_date, None
 
-        start_date = currency_trades['Date'].min().strftime("%Y-%m-%d")
-        # TODO: Fetch last traded date if all sold, otherwise today's date
-        today = datetime.date.today().strftime("%Y-%m-%d")
+    return stored.index[-2], stored
 
-        # Download the Forex prices with the base currency from Yahoo Finance
-        # TODO: Handle dates when forex isn't traded on the first of the month
-        forex = yf.Ticker(currency+BASE_CURRENCY+'=X').history(
-            start=start_date, end=today, interval="1mo")[['Close']]
 
+def store_history(ticker, path, history, stored):
+    """Write a fetched history to path, appending just the new rows when it
+    continues the stored closes. Returns False if earlier closes have been
+    adjusted since they were stored, so the full history is needed."""
+    if stored is None:
         # If historic prices exist, write them to a CSV file
+        if not history.empty:
+            file.write_atomic(path, history.to_csv())
+        return True
+
+    overlap_date = stored.index[-2]
+    closes = pd.Series(history['Close'].values, index=date_keys(history))
+
+    # Yahoo Finance leaves some forex closes empty, and an empty close that
+    # is still empty hasn't been adjusted
+    if overlap_date not in closes.index or not np.isclose(
+            closes[overlap_date], stored[overlap_date],
+            rtol=ADJUSTMENT_TOLERANCE, atol=0, equal_nan=True):
+        print(f'History for {ticker} has been adjusted. Downloading it in full.')
+        return False
+
+    new_rows = history[date_keys(history) > overlap_date]
+    file.append_csv_rows(path, new_rows.to_csv(header=False),
+                         keep=len(stored) - 1)
+    return True
+
+
+def is_complete(path, stored, end_date, interval=INTERVAL):
+    """Return whether the closes stored at path already cover a history that
+    ended before today: they reach the end date and were written after it,
+    so the last row is no longer a partial period"""
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    if stored is None or end_date >= today or \
+            stored.index[-1] < batch_start(end_date, interval):
+        return False
+
+    written = datetime.date.fromtimestamp(os.path.getmtime(path))
+    return written.strftime("%Y-%m-%d") >= end_date
+
+
+def refresh_histories(jobs, incremental=True):
+    """Bring the histories stored for (ticker, path, start date, end date)
+    jobs up to date, fetching them in batched requests"""
+    plans = {}
+    for ticker, path, start_date, end_date in jobs:
+        fetch_date, stored = plan_fetch(path, start_date, incremental)
+
+        # Positions sold before the stored history ends need nothing more
+        if is_complete(path, stored, end_date):
+            continue
+
+        plans[ticker] = (path, start_date, end_date, fetch_date, stored)
+
+    histories = fetch_grouped([(ticker, plan[3], plan[2])
+                               for ticker, plan in plans.items()])
+
+    adjusted = []
+    stored_histories = {}
+    for ticker, (path, start_date, end_date, _, stored) in plans.items():
+        if ticker not in histories:
+            continue
+        if store_history(ticker, path, histories[ticker], stored):
+            stored_histories[path] = histories[ticker]
+        else:
+            adjusted.append((ticker, start_date, end_date))
+
+    # Histories that have been adjusted are downloaded again in full
+    histories = fetch_grouped(adjusted)
+    for ticker, _, _ in adjusted:
+        if ticker in histories:
+            store_history(ticker, plans[ticker][0], histories[ticker], None)
+            stored_histories[plans[ticker][0]] = histories[ticker]
+
+    # Everything fetched goes into the warehouse in one transaction per
+    # directory, named after the file it is stored in (e.g. AUDUSD in forex
+    # rather than AUDUSD=X)
+    datasets = {}
+    for path, history in stored_histories.items():
+        directory, name = os.path.split(path)
+        datasets.setdefault(os.path.basename(directory), {})[
+            os.path.splitext(name)[0]] = history
+    for dataset, histories in datasets.items():
+        warehouse.upsert(histories, dataset)
+
+
+def fetch_end_date(end, today):
+    """Return the (exclusive) end date to fetch a history to: the day after a
+    position was fully sold, or today while it is still held"""
+    if pd.isna(end):
+        return today
+    return (end + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def download_historic_prices(trades, incremental=True):
+    # Dates each stock was first bought and, if it has all been sold, last
+    # sold, from one pass over the trades
+    spans = ledger.as_index(trades).holding_spans('Symbol')
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    jobs = []
+    for symbol, span in spans.iterrows():
+        start_date = span['Start'].strftime("%Y-%m-%d")
+        jobs.append((symbol, file.make_path(symbol), start_date,
+                     fetch_end_date(span['End'], today)))
+
+    # Download the historic prices from Yahoo Finance. Drop all corporate
+    # actions (for simplicity). Later we can separate these out into their own
+    # files and use them to calculate portfolio performance
+    refresh_histories(jobs, incremental=incremental)
+
+
+def download_forex(trades, incremental=True):
+    # Dates each currency was needed from and until, over all the stocks
+    # held in it
+    spans = ledger.as_index(trades).grouped_spans('Currency')
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    jobs = []
+    for currency, span in spans.iterrows():
+        # No need to fetch the base currency (no conversion needed)
+        if currency == BASE_CURRENCY:
+            continue
+
+        start_date = span['Start'].strftime("%Y-%m-%d")
         output_file = file.make_path(currency + BASE_CURRENCY, 'forex')
-        forex.to_csv(output_file)
+        jobs.append((currency + BASE_CURRENCY + '=X', output_file, start_date,
+                     fetch_end_date(span['End'], today)))
+
+    # Download the Forex prices with the base currency from Yahoo Finance.
+    # Dates that aren't quoted use the latest earlier rate (see forex.py)
+    refresh_histories(jobs, incremental=incremental)
 
 
 def main():
-    trades = file.read_trades_csv()
+    # Grouped once and shared by both downloaders
+    trades = ledger.TradeIndex(file.read_trades_csv())
+
+    # Pass --full to download every history from scratch
+    incremental = '--full' not in sys.argv[1:]
 
-    download_forex(trades)
+    download_forex(trades, incremental=incremental)
 
-    download_historic_prices(trades)
+    download_historic_prices(trades, incremental=incremental)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+import datetime
+from functools import partial
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import analytics
+import benchmark
+import cache
+import compact
+import file
+import forex
+import holdings
+import ledger
+import pricing
+import render
+import store
+import warehouse
+
+def read_close(symbol, start=None, end=None):
+    """Read the stored closes of symbol from the one in effect on the start
+    date (the last on or before it) to the end date, named after the symbol.
+    Module level so it can be used in worker processes."""
+    df = store.read_frame(symbol, columns=['Close'], start=start, end=end,
+                          asof=True)
+    return df.rename(columns={'Close': symbol})
+
+
+def read_held(symbol, windows):
+    """Read the stored closes of symbol over just the (start, end) windows it
+    was held in"""
+    frames = [read_close(symbol, start, end) for start, end in windows[symbol]]
+    return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+def read_closes(symbols, start=None, end=None):
+    """Read the stored closes of every symbol, like read_close, in one
+    warehouse query, returning the frames and skipped symbols like
+    pricing.read_all"""
+    closes = warehouse.read_field(symbols, 'Close', start, end, asof=True)
+    frames = [closes[[symbol]].dropna() for symbol in closes.columns]
+    skipped = {symbol: 'no pricing data' for symbol in symbols
+               if symbol not in closes.columns}
+    return frames, skipped
+
+
+def read_all_held(symbols, windows):
+    """Read the stored closes of every symbol in one warehouse query, keeping
+    each one's rows in the (start, end) windows it was held in and the close
+    in effect at the start of each"""
+    spans = [span for symbol in symbols for span in windows[symbol]]
+    frames, skipped = read_closes(symbols, min(start for start, _ in spans),
+                                  max(end for _, end in spans))
+
+    held = []
+    for frame in frames:
+        keep = np.zeros(len(frame), dtype=bool)
+        for start, end in windows[frame.columns[0]]:
+            keep |= (frame.index >= start) & (frame.index <= end)
+            first = frame.index.searchsorted(start, side='right') - 1
+            if first >= 0:
+                keep[first] = True
+        held.append(frame[keep])
+    return held, skipped
+
+
+def read_trades(end=None, symbols=None):
+    """Stream the trades csv, keeping only trades on or before end in the
+    given symbols. Trades before the start of a window still count, as they
+    make up the positions held at the start."""
+    chunks = []
+    for chunk in file.iter_trades_csv():
+        if end is not None:
+            chunk = chunk[chunk['Date'] <= end]
+        if symbols is not None:
+            chunk = chunk[chunk['Symbol'].isin(symbols)]
+        chunks.append(chunk)
+
+    if not chunks:
+        return pd.DataFrame(columns=['Date', 'Symbol', 'Type'])
+
+    # Chunks have different categories, so give them all the union of them
+    # before joining them, rather than widening them to plain labels
+    for column, dtype in chunks[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = union_categoricals(
+                [chunk[column] for chunk in chunks]).categories
+            chunks = [chunk.assign(**{column: chunk[column].cat.set_categories(
+                categories)}) for chunk in chunks]
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+class Analysis:
+    """A lazily evaluated portfolio analysis.
+
+    Filters are chained onto the analysis, e.g.
+
+        Analysis().between('2016-07-16', '2017-07-14').against('^AXJO')
+
+    and nothing is read until a result (value, returns, report or plot) is
+    asked for. The date window and symbols are then pushed down into the
+    trades, price and forex loaders, so a one year report only reads one year
+    of prices. Each stage is built once and kept for later results."""
+
+    def __init__(self, start=None, end=None, symbols=None, frequency='MS',
+                 benchmarks=None, base=forex.BASE_CURRENCY, compact=False):
+        self.start = None if start is None else pd.Timestamp(start)
+        self.end = None if end is None else pd.Timestamp(end)
+        self.symbol_filter = None if symbols is None else sorted(symbols)
+        self.frequency = frequency
+        self.benchmarks = benchmarks
+        self.base = base
+        self.compact = compact
+        self._results = {}
+
+    def _replace(self, **changes):
+        settings = dict(start=self.start, end=self.end,
+                        symbols=self.symbol_filter, frequency=self.frequency,
+                        benchmarks=self.benchmarks, base=self.base,
+                        compact=self.compact)
+        settings.update(changes)
+        return Analysis(**settings)
+
+    def between(self, start=None, end=None):
+        """Restrict the analysis to the dates from start to end (inclusive)"""
+        return self._replace(start=start, end=end)
+
+    def only(self, symbols):
+        """Restrict the analysis to trades in the given symbols"""
+        return self._replace(symbols=[symbols] if isinstance(symbols, str)
+                             else symbols)
+
+    def every(self, frequency):
+        """Value the portfolio at a pandas frequency, e.g. 'D', 'W' or 'MS'"""
+        return self._replace(frequency=frequency)
+
+    def against(self, benchmarks):
+        """Compare against benchmarks, in any form accepted by
+        benchmark.normalize_benchmarks. A single symbol is named Benchmark."""
+        if isinstance(benchmarks, str):
+            benchmarks = {'Benchmark': benchmarks}
+        return self._replace(benchmarks=benchmarks)
+
+    def compacted(self):
+        """Hold prices as float32 and positions as runs, for very large
+        universes (see compact.py for the precision)"""
+        return self._replace(compact=True)
+
+    def _stage(self, name, build):
+        if name not in self._results:
+            self._results[name] = build()
+        return self._results[name]
+
+    def trades(self):
+        return self._stage('trades', lambda: read_trades(
+            self.end, self.symbol_filter))
+
+    def dates(self):
+        def build():
+            trades = self.trades()
+            if trades.empty:
+                return pd.DatetimeIndex([])
+
+            start = trades['Date'].min()
+            if self.start is not None:
+                start = max(start, self.start)
+            end = self.end if self.end is not None else \
+                pd.Timestamp(datetime.date.today())
+
+            return pd.date_range(start, end, freq=self.frequency)
+
+        return self._stage('dates', build)
+
+    def trade_index(self):
+        return self._stage('trade_index',
+                           lambda: ledger.TradeIndex(self.trades()))
+
+    def symbols(self):
+        return self._stage('symbols', lambda: sorted(
+            self.trade_index().keys('Symbol')))
+
+    def held(self):
+        """Return the holding intervals that overlap the window, clipped to
+        it"""
+        def build():
+            dates = self.dates()
+            intervals = self.trade_index().holding_intervals('Symbol')
+            if dates.empty:
+                return intervals[:0]
+            return ledger.held_between(intervals, dates[0], dates[-1])
+
+        return self._stage('held', build)
+
+    def prices(self):
+        def build():
+            dates = self.dates()
+            if dates.empty:
+                return compact.CompactPrices.assemble([], dates) \
+                    if self.compact else pd.DataFrame(index=dates)
+
+            # Only the symbols held in the window are read, and only for the
+            # dates they were held (from the close in effect when each holding
+            # starts). Their positions are zero on every other date, so no
+            # other price is ever used.
+            windows = {}
+            for symbol, start, end in self.held().itertuples(index=False):
+                windows.setdefault(symbol, []).append((start, end))
+            symbols = sorted(windows)
+            reader = partial(read_held, windows=windows)
+
+            # The windows come from the trades, so they are part of the key
+            paths = [file.make_path(symbol) for symbol in symbols] + \
+                [file.make_path('trades', '')]
+
+            # The warehouse reads every symbol in one query
+            read_many = partial(read_all_held, windows=windows) \
+                if store.backend() == 'warehouse' and symbols else None
+
+            source = 'pipeline/compact-asof' if self.compact else \
+                'pipeline/close-asof'
+            return cache.cached(source, symbols, dates, paths,
+                                lambda: pricing.construct(
+                                    symbols, dates, reader,
+                                    compact=self.compact, asof=True,
+                                    read_many=read_many))
+
+        return self._stage('prices', build)
+
+    def forex(self):
+        def build():
+            currencies = self.trade_index().keys('Currency').tolist()
+            return forex.get_rates(currencies, self.dates(), base=self.base)
+
+        return self._stage('forex', build)
+
+    def benchmark_values(self):
+        def build():
+            benchmarks = benchmark.normalize_benchmarks(self.benchmarks)
+            symbols = sorted({symbol for legs in benchmarks.values()
+                              for symbol in legs})
+            trades = self.trades()
+            dates = self.dates()
+
+            # Trades from before the window buy benchmark units at the price
+            # on their own date, so the benchmarks are read from the first
+            # trade rather than the start of the window
+            start = trades['Date'].min()
+            if store.backend() == 'warehouse':
+                frames, skipped = read_closes(symbols, start, dates[-1])
+            else:
+                frames, skipped = pricing.read_all(
+                    symbols, partial(read_close, start=start, end=dates[-1]))
+            pricing.report_skipped(skipped)
+            if not frames:
+                return pd.DataFrame(index=dates, columns=list(benchmarks))
+
+            history = pd.concat(frames, axis=1)
+            prices = pricing.assemble(frames, history.index.union(dates),
+                                      asof=True)
+
+            values = benchmark.get_benchmark_values(
+                self.priced_trades(), prices, benchmarks, skip_unpriced=False)
+            return values.reindex(dates)
+
+        return self._stage('benchmark', build)
+
+    def priced_trades(self):
+        """Return the trades that are valued in the portfolio, which the
+        benchmarks and flows follow. Symbols not held in the window aren't
+        read, so only the ones that failed to read are left out.
+
+        The portfolio is valued in the base currency, so each trade's price
+        is converted into it at the rate on the trade date."""
+        def build():
+            trades = self.trades()
+            skipped = self.prices().attrs.get('skipped', {})
+            trades = trades[~trades['Symbol'].isin(list(skipped))]
+            if 'Currency' not in trades.columns:
+                return trades
+
+            currencies = self.trade_index().keys('Currency').tolist()
+            matrix = forex.get_rate_matrix(currencies, base=self.base)
+            return trades.assign(Price=forex.convert(
+                trades['Price'], trades['Date'], trades['Currency'], matrix,
+                base=self.base))
+
+        return self._stage('priced_trades', build)
+
+    def flows(self):
+        """Return the cash paid into the portfolio on each date"""
+        def build():
+            trades = self.priced_trades()
+            quantity = 'Quantity' if 'Quantity' in trades.columns else 'Shares'
+            return analytics.get_flows(trades, self.dates(), quantity=quantity)
+
+        return self._stage('flows', build)
+
+    def value(self):
+        """Return the (date x column) value of the portfolio, and of any
+        benchmarks, over the window"""
+        def build():
+            trades = self.trades()
+            quantity = 'Quantity' if 'Quantity' in trades.columns else 'Shares'
+            engine = compact if self.compact else holdings
+            values = engine.get_converted_value_over_time(
+                trades, self.prices(), self.forex(), quantity=quantity)
+
+            if self.benchmarks is not None and not self.dates().empty:
+                values = values.join(self.benchmark_values())
+
+            return values
+
+        return self._stage('value', build)
+
+    def returns(self):
+        return self._stage('returns',
+                           lambda: analytics.daily_returns(self.value()))
+
+    def report(self):
+        return self._stage('report', lambda: analytics.risk_report(
+            self.value(), flows=self.flows()))
+
+    def plot(self, ylabel="Value", title="Portfolio value", path=None):
+        """Save a chart of the value to path, by default named after the
+        title in render.CHART_DIRECTORY. Returns the path written."""
+        return render.plot_data(self.value(), ylabel=ylabel, title=title,
+                                path=path)
@@ -1,8 +1,15 @@
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
 import datetime
-import numpy as np
+from functools import partial
+import file
+import holdings
+import analytics
+import pricing
+import cache
+import valuation
+import render
+import store
 
 def get_date_range(trades):
     start_date = trades['Date'].min().strftime("%Y-%m-%d") # Date of earliest trade
@@ -32,129 +39,60 @@ def read_trades_csv():
     return df
 
 def read_historical_csv(symbol, exchange=''):
-    if exchange is 'ASX':
+    if exchange == 'ASX':
         symbol += '.XASX'
 
-    path = filename_to_path(symbol, base_dir='data/historical-prices')
-
-    # Read data in from csv file
-    try:
-        df = pd.read_csv(path,
-                     index_col='Date',
-                     parse_dates=True,
-                     usecols=['Date', 'Adj Close'],
-                     na_values=['nan'])
-
-    # If there are any data errors, just print an error and skip this stock
-    except ValueError as err:
-        print('Failed to read data for: ' + symbol, err)
-        return None
+    # Read data in from the price store, or the warehouse with
+    # PORTFOLIO_STORE=warehouse. Missing files and data errors are raised so
+    # the caller can skip this stock
+    df = store.read_frame(symbol, file.LEGACY_PRICES_DIRECTORY,
+                          columns=['Adj Close'])
 
     # Rename adj close column to symbol name
     df = df.rename(columns={'Adj Close': symbol})
 
     return df
 
+def read_symbol_csv(benchmark_symbol, symbol):
+    exchange = '' if symbol == benchmark_symbol else 'ASX'
+    return read_historical_csv(symbol, exchange=exchange)
+
+def price_paths(symbols, benchmark_symbol='^AXJO'):
+    """Return the paths of the files construct_prices_dataframe reads"""
+    paths = [file.make_path(benchmark_symbol, file.LEGACY_PRICES_DIRECTORY)]
+    for symbol in symbols:
+        paths.append(file.make_path(symbol + '.XASX', file.LEGACY_PRICES_DIRECTORY))
+    return paths
+
 def construct_prices_dataframe(symbols, dates, benchmark_symbol='^AXJO'):
     """Construct a dataframe of historical prices for the given symbols over
     the given dates"""
 
-    prices = pd.DataFrame(index=dates)
-
     if benchmark_symbol not in symbols:
         symbols.insert(0, benchmark_symbol)
 
-    for symbol in symbols:
-        if symbol is benchmark_symbol:
-            exchange = ''
-        else:
-            exchange = 'ASX'
-
-        dfStock = read_historical_csv(symbol, exchange=exchange)
-
-        if dfStock is None:
-            continue
-
-        # Round to two dec. places
-        # dfStock = dfStock.round(2)
-
-        # Join with main dataframe
-        prices = prices.join(dfStock)
-
-        # Drop any dates benchmark didn't trade on
-        if symbol == benchmark_symbol:
-            prices = prices.dropna(subset=[benchmark_symbol])
-
-    prices = prices.fillna(value=0)
-
-    return prices
+    # Drop any dates benchmark didn't trade on
+    return pricing.construct(symbols, dates,
+                             partial(read_symbol_csv, benchmark_symbol),
+                             required=benchmark_symbol)
 
 def normalize_data(df):
     return df / df.ix[0,:]
 
-def plot_data(df, ylabel="Value", title="Portfolio value"):
-    ax = df.plot(title=title, fontsize=14)
-    ax.set_xlabel("Date")
-    ax.set_ylabel(ylabel)
-    plt.show()
-
 def plot_individual_stock_prices(symbols, dates):
     df = construct_prices_dataframe(symbols, dates)
     df = normalize_data(df)
-    plot_data(df, title="Stock Prices", ylabel="Price")
+    render.plot_data(df, title="Stock Prices", ylabel="Price")
 
 def get_portfolio_value_over_time(trades, prices, exchange='', benchmark_symbol='^AXJO'):
     """Takes a dataframe of trades and returns a dataframe of value each day
     from the earliest trade date to today"""
-
-    # Create a dataframe with the same dates as the prices df
-    # (hence excludes non-trading days)
-    holdings = pd.DataFrame(data=np.zeros((prices.index.values.size, 2)),
-                            index=prices.index.values,
-                            columns=['Portfolio', 'Benchmark'])
-
-    for index, trade in trades.iterrows():
-        symbol = trade.Symbol
-        if exchange is 'ASX':
-            symbol += '.XASX'
-
-        # Skip any stocks with no price data
-        if symbol not in prices.columns:
-            continue
-
-        trade_holding = pd.Series(data=0, index=prices.index.values)
-        bm_holding = pd.Series(data=0, index=prices.index.values)
-
-        # Sell trades should subtract the holding
-        if trade.Type == 'Buy':
-            sign = 1
-        else:
-            sign = -1
-
-        # Set the holding value after the trade date to be the number of shares
-        # traded multiplied by the price on that date
-        # adjusted_shares = trade.Shares * trade.Price / prices.ix[trade['Date'], symbol]
-        trade_holding.ix[trade['Date']:] = sign * trade.Shares * prices[symbol]
-
-        adjusted_bm_shares = trade.Shares * trade.Price / prices.ix[trade['Date'], benchmark_symbol]
-        bm_holding.ix[trade['Date']:] = sign * adjusted_bm_shares * prices[benchmark_symbol]
-
-        holdings['Portfolio'] += trade_holding
-        holdings['Benchmark'] += bm_holding
-
-    return holdings
+    return holdings.get_portfolio_value_over_time(
+        trades, prices, exchange=exchange, benchmark_symbol=benchmark_symbol)
 
 def compute_daily_returns(df):
-    # Match rows and columns of original dataframe
-    daily_returns = df.copy()
-
-    # Compute daily returns for row 1 onwards
-    daily_returns[1:] = (df[1:] / df[:-1].values) - 1
-
-    # Initial row is uncalculatable, so set it to 0
-    daily_returns.ix[0, :] = 0
-
-    return daily_returns
+    # Vectorized returns with the initial (uncalculatable) row set to 0
+    return analytics.daily_returns(df)
 
 def compute_rolling_mean(df, window=30):
     return df.rolling(window).mean()
@@ -168,14 +106,19 @@ def test_run():
     # Define a date range
     dates = get_date_range(trades)
 
-    # Get historical prices for all traded stocks
-    prices = construct_prices_dataframe(symbols, dates)
+    # Get historical prices for all traded stocks, reusing the cached prices
+    # if none of the files have changed
+    prices = cache.cached('portfolio/adj-close', symbols, dates,
+                          price_paths(symbols),
+                          lambda: construct_prices_dataframe(list(symbols), dates))
 
     # US funds skew the pf value due to different non-trading days from the benchmark
-    del prices['VTS.XASX']
-    del prices['VAS.XASX']
+    prices = prices.drop(columns=['VTS.XASX', 'VAS.XASX'])
 
-    portfolio = get_portfolio_value_over_time(trades, prices, 'ASX')
+    # Only the dates since the last run are revalued, unless the trades or
+    # earlier prices have changed
+    portfolio = valuation.update_portfolio_value(
+        'portfolio', trades, prices, 'ASX', benchmark_symbol='^AXJO')
 
     # Get weekly prices, rather than daily
     # portfolio_weekly = portfolio['2014-01-01':'2016-11-22':5]
@@ -187,11 +130,11 @@ def test_run():
     # prices = prices.ix['2016-10-10':'2016-10-20', :]
     #
     # del prices['^AXJO']
-    # plot_data(prices)
+    # render.plot_data(prices)
 
     daily_returns = compute_daily_returns(portfolio)
     daily_returns = compute_rolling_mean(daily_returns)
-    plot_data(daily_returns)
+    render.plot_data(daily_returns)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import pandas as pd
+import compact as compact_prices
+import instrument
+import lookup
+
+# Number of parallel reads, and whether they run in threads (I/O bound reads,
+# e.g. from network storage) or processes (parse heavy CSV reads). Readers run
+# in processes must be module level functions so they can be pickled.
+LOAD_WORKERS = int(os.environ.get('PORTFOLIO_LOAD_WORKERS', 8))
+LOAD_EXECUTOR = os.environ.get('PORTFOLIO_LOAD_EXECUTOR', 'thread')
+
+# Symbols handed to each worker process at a time
+PROCESS_CHUNK_SIZE = 16
+
+
+def read_one(reader, symbol):
+    """Read one symbol, returning its frame or the reason it was skipped"""
+    try:
+        with instrument.span('read_prices', symbol=symbol):
+            df = reader(symbol)
+    except FileNotFoundError:
+        return None, 'no pricing data'
+    except (ValueError, KeyError) as err:
+        return None, 'failed to read data: {}'.format(err)
+
+    instrument.count('price_rows', len(df))
+
+    # Duplicate dates can't be aligned, so keep the latest row for each
+    return df[~df.index.duplicated(keep='last')], None
+
+
+def read_all(symbols, reader, workers=None, executor=None):
+    """Read the price history of each symbol with reader, fanning the reads
+    out over a pool of thread or process workers.
+
+    Returns the frames that could be read, in symbol order, and a dict of the
+    symbols that were skipped with the reason why."""
+    workers = LOAD_WORKERS if workers is None else workers
+    executor = LOAD_EXECUTOR if executor is None else executor
+    read = partial(read_one, reader)
+
+    if workers <= 1 or len(symbols) <= 1:
+        results = list(map(read, symbols))
+    elif executor == 'process':
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(read, symbols,
+                                    chunksize=PROCESS_CHUNK_SIZE))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(read, symbols))
+
+    frames = []
+    skipped = {}
+
+    for symbol, (df, reason) in zip(symbols, results):
+        if df is None:
+            skipped[symbol] = reason
+        else:
+            frames.append(df)
+
+    return frames, skipped
+
+
+def assemble(frames, dates, required=None, fill_value=0, asof=False):
+    """Align all frames to the dates in a single concat/reindex. With asof
+    set, each date takes the latest quote on or before it (e.g. Friday's
+    close on a weekend) rather than only a quote on that exact date.
+
+    Dates where the `required` column (e.g. the benchmark) has no price are
+    dropped, then any remaining gaps are filled with `fill_value` (unless it
+    is None)."""
+    if not frames:
+        return pd.DataFrame(index=dates)
+
+    prices = pd.concat(frames, axis=1)
+    prices = lookup.asof_frame(prices, dates) if asof else \
+        prices.reindex(dates)
+
+    # Drop any dates the required symbol didn't trade on
+    if required is not None and required in prices.columns:
+        prices = prices.dropna(subset=[required])
+
+    if fill_value is None:
+        return prices
+
+    return prices.fillna(value=fill_value)
+
+
+def report_skipped(skipped):
+    """Print one summary of the symbols left out of a price matrix"""
+    if not skipped:
+        return
+
+    print('Skipped {} symbols:'.format(len(skipped)))
+    for symbol, reason in skipped.items():
+        print('  {}: {}'.format(symbol, reason))
+
+
+def construct(symbols, dates, reader, required=None, fill_value=0,
+              workers=None, executor=None, compact=False, asof=False,
+              read_many=None):
+    """Read and align the prices for all symbols (see assemble). The skipped
+    symbols are reported and kept in the `skipped` attribute of the result.
+
+    Given read_many, every symbol is read with one call of it (e.g. one
+    warehouse query) rather than with reader one at a time. It returns the
+    frames and skipped symbols like read_all.
+
+    With compact set, the result is a compact.CompactPrices float32 matrix
+    rather than a dataframe."""
+    with instrument.span('construct_prices', symbols=len(symbols)):
+        if read_many is not None:
+            with instrument.span('read_prices', symbols=len(symbols)):
+                frames, skipped = read_many(symbols)
+        else:
+            frames, skipped = read_all(symbols, reader, workers=workers,
+                                       executor=executor)
+        with instrument.span('assemble_prices'):
+            if compact:
+                prices = compact_prices.CompactPrices.assemble(
+                    frames, dates, required=required, fill_value=fill_value,
+                    asof=asof)
+            else:
+                prices = assemble(frames, dates, required=required,
+                                  fill_value=fill_value, asof=asof)
+
+    report_skipped(skipped)
+    prices.attrs['skipped'] = skipped
+
+    return prices
@@ -0,0 +1,275 @@
+import abc
+import asyncio
+import io
+import os
+import pandas as pd
+import download
+import file
+import instrument
+import store
+import warehouse
+
+# Overridable so fetches can be pointed at local stand-in servers
+XIGNITE_HOST = os.environ.get('XIGNITE_HOST', 'https://www.xignite.com')
+ALPHA_VANTAGE_HOST = os.environ.get('ALPHA_VANTAGE_HOST',
+                                    'https://www.alphavantage.co')
+
+# Exchange of each ticker suffix used by any of the providers
+EXCHANGE_SUFFIXES = {'.AX': 'ASX', '.XASX': 'ASX'}
+
+
+def split_exchange(symbol):
+    """Return a symbol without its exchange suffix, and the exchange (None
+    if it has no known suffix)"""
+    for suffix, exchange in EXCHANGE_SUFFIXES.items():
+        if symbol.endswith(suffix):
+            return symbol[:-len(suffix)], exchange
+    return symbol, None
+
+
+class Provider(abc.ABC):
+    """A source of historical closes.
+
+    Subclasses implement fetch_sync, which is run in a worker thread and
+    returns a dataframe indexed by date with a Close column. It is given the
+    provider's timeout and must pass it to every request it makes, as a
+    worker thread can't be cancelled once it has started."""
+
+    name = 'provider'
+
+    # Request budget: requests started per second and requests in flight
+    rate = 2.0
+    concurrency = 4
+
+    # Seconds to wait on a request before failing over to the next provider
+    timeout = 30
+
+    # The ticker suffix this provider uses for each exchange
+    suffixes = {}
+
+    def provider_symbol(self, symbol):
+        """Return a symbol in this provider's symbology, e.g. BHP.AX (or
+        BHP.XASX) as BHP.XASX for Xignite"""
+        base, exchange = split_exchange(symbol)
+        if exchange not in self.suffixes:
+            return symbol
+        return base + self.suffixes[exchange]
+
+    async def fetch(self, symbol, start_date, end_date):
+        return await asyncio.to_thread(self.fetch_sync, symbol, start_date,
+                                       end_date, self.timeout)
+
+    @abc.abstractmethod
+    def fetch_sync(self, symbol, start_date, end_date, timeout):
+        """Return the closes of symbol (in this provider's symbology) from
+        start_date to end_date"""
+
+
+class YFinanceProvider(Provider):
+    name = 'yfinance'
+    rate = 2.0
+    suffixes = {'ASX': '.AX'}
+
+    def __init__(self, interval='1mo'):
+        self.interval = interval
+
+    def fetch_sync(self, symbol, start_date, end_date, timeout):
+        import yfinance as yf
+
+        prices = yf.Ticker(symbol).history(
+            start=start_date, end=end_date, interval=self.interval,
+            timeout=timeout)[['Close']]
+        return prices.dropna()
+
+    def fetch_batch(self, tickers, start_date, end_date):
+        """Download the closes of many tickers in one request. Returns a
+        dict of ticker to its closes."""
+        # Imported here so planning and the CLI don't pay for it
+        import yfinance as yf
+
+        with instrument.span('fetch_batch', tickers=len(tickers)):
+            data = yf.download(' '.join(tickers), start=start_date,
+                               end=end_date, interval=self.interval,
+                               group_by='ticker', auto_adjust=True,
+                               progress=False, timeout=self.timeout)
+        instrument.count('fetched_rows', len(data))
+
+        if not isinstance(data.columns, pd.MultiIndex):
+            data.columns = pd.MultiIndex.from_product([tickers, data.columns])
+
+        histories = {}
+        for ticker in tickers:
+            if ticker not in data.columns.get_level_values(0):
+                continue
+
+            # Rows only exist in the combined download because another ticker
+            # traded on that date, so drop the empty ones
+            histories[ticker] = data[ticker][['Close']].dropna()
+
+        return histories
+
+
+class XigniteProvider(Provider):
+    name = 'xignite'
+    rate = 10.0
+    concurrency = 8
+    suffixes = {'ASX': '.XASX'}
+
+    # Retries of a dropped connection or a 429/5xx response
+    retries = 2
+
+    def __init__(self, session=None, host=None):
+        self.host = XIGNITE_HOST if host is None else host
+        self.session = session or download.make_session(self.concurrency)
+
+    def make_url(self, symbol, start_date, end_date):
+        start = pd.Timestamp(start_date).strftime('%m/%d/%Y')
+        end = pd.Timestamp(end_date).strftime('%m/%d/%Y')
+        return (f"{self.host}/xGlobalHistorical.csv/GetGlobalHistoricalQuotesRange"
+                f"?_token={os.environ['XIGNITE_API_KEY']}&StartDate={start}"
+                f"&EndDate={end}&IdentifierType=Symbol"
+                f"&AdjustmentMethod=SplitAndProportionalCashDividend"
+                f"&Identifier={symbol}")
+
+    def fetch_sync(self, symbol, start_date, end_date, timeout):
+        # The response is streamed to where portfolio-excl-benchmark.py reads
+        # Xignite downloads from, then parsed from there
+        path = download.fetch_to_file(
+            self.session, self.make_url(symbol, start_date, end_date),
+            file.make_path(symbol, file.LEGACY_PRICES_DIRECTORY),
+            retries=self.retries, timeout=timeout)
+        return store.read_csv_frame(path)[['Close']].sort_index()
+
+
+class AlphaVantageProvider(Provider):
+    name = 'alpha-vantage'
+    suffixes = {'ASX': '.AX'}
+
+    # The free tier allows 5 requests a minute
+    rate = 5 / 60
+    concurrency = 1
+
+    # A compact response only holds the latest 100 trading days
+    COMPACT_DAYS = 100
+
+    def __init__(self, session=None, host=None):
+        self.host = ALPHA_VANTAGE_HOST if host is None else host
+        self.session = session or download.make_session(self.concurrency)
+
+    def make_url(self, symbol, start_date):
+        compact = start_date is not None and pd.Timestamp(start_date) >= \
+            pd.Timestamp.today() - pd.offsets.BDay(self.COMPACT_DAYS)
+        return (f"{self.host}/query?function=TIME_SERIES_DAILY"
+                f"&symbol={symbol}&datatype=csv"
+                f"&outputsize={'compact' if compact else 'full'}"
+                f"&apikey={os.environ['ALPHA_VANTAGE_API_KEY']}")
+
+    def fetch_sync(self, symbol, start_date, end_date, timeout):
+        text = download.fetch_text(self.session,
+                                   self.make_url(symbol, start_date),
+                                   retries=0, timeout=timeout)
+
+        # Errors and rate limit notices come back as JSON with a 200
+        df = pd.read_csv(io.StringIO(text))
+        if 'close' not in df.columns:
+            raise ValueError(f'Alpha Vantage returned no prices for {symbol}: '
+                             f'{text[:200]}')
+
+        df = pd.DataFrame({'Close': pd.to_numeric(df['close'])},
+                          index=pd.DatetimeIndex(df['timestamp'], name='Date'))
+        df = df.sort_index()
+        return df.loc[start_date:end_date]
+
+
+class Budget:
+    """A provider's rate limit and concurrency limit, bound to one event loop"""
+
+    def __init__(self, provider):
+        self.name = provider.name
+        self.limiter = download.RateLimiter(provider.rate)
+        self.semaphore = asyncio.Semaphore(provider.concurrency)
+
+    async def wait(self):
+        await asyncio.sleep(max(self.limiter.reserve(self.name), 0))
+
+
+async def fetch_symbol(symbol, start_date, end_date, providers, budgets):
+    """Fetch one symbol from the first provider that answers in time. Each
+    provider is asked for it in its own symbology.
+
+    Returns (symbol, prices, provider name or dict of errors by provider)."""
+    errors = {}
+
+    for provider in providers:
+        budget = budgets[provider.name]
+        try:
+            async with budget.semaphore:
+                await budget.wait()
+                with instrument.span('fetch', symbol=symbol,
+                                     provider=provider.name):
+                    # Requests time out themselves, so a slow provider's
+                    # thread ends rather than being left running
+                    prices = await provider.fetch(
+                        provider.provider_symbol(symbol), start_date,
+                        end_date)
+        except Exception as err:
+            # Slow or failing, so fail over to the next provider
+            errors[provider.name] = err
+            continue
+
+        return symbol, prices, provider.name
+
+    return symbol, None, errors
+
+
+async def fetch_all(symbols, start_date, end_date, providers):
+    """Fetch every symbol concurrently, each within its provider's budget,
+    failing over from the first provider to the next.
+
+    Returns a dict of symbol to prices and a dict of symbol to the errors from
+    every provider for the symbols that couldn't be fetched."""
+    budgets = {provider.name: Budget(provider) for provider in providers}
+
+    results = await asyncio.gather(*[
+        fetch_symbol(symbol, start_date, end_date, providers, budgets)
+        for symbol in symbols])
+
+    fetched = {}
+    failed = {}
+    for symbol, prices, source in results:
+        if prices is None:
+            failed[symbol] = source
+        else:
+            fetched[symbol] = prices
+
+    return fetched, failed
+
+
+def write_history(symbol, prices, parent_dir=file.PRICES_DIRECTORY):
+    """Write fetched closes to the store in the common Date,Close layout"""
+    if prices.empty:
+        return
+    prices = prices[['Close']].rename_axis('Date')
+    file.write_atomic(file.make_path(symbol, parent_dir), prices.to_csv())
+
+
+def refresh(symbols, start_date, end_date, providers=None,
+            parent_dir=file.PRICES_DIRECTORY):
+    """Fetch and store the closes of every symbol, named as given. Returns
+    the symbols that couldn't be fetched from any provider, with each
+    provider's error."""
+    if providers is None:
+        providers = [YFinanceProvider(), XigniteProvider()]
+
+    fetched, failed = asyncio.run(
+        fetch_all(symbols, start_date, end_date, providers))
+
+    for symbol, prices in fetched.items():
+        write_history(symbol, prices, parent_dir)
+    warehouse.upsert({symbol: prices[['Close']]
+                      for symbol, prices in fetched.items()}, parent_dir)
+
+    for symbol, errors in failed.items():
+        print(f'Failed to fetch {symbol}:', errors)
+
+    return failed
@@ -0,0 +1,160 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Charts plotted without a path are saved here, named after their title.
+# They are always drawn without a display, so plotting never blocks and works
+# in batch jobs.
+CHART_DIRECTORY = os.environ.get('PORTFOLIO_CHART_DIRECTORY', 'charts')
+CHART_FORMAT = 'png'
+
+# Number of worker processes rendering charts at once
+RENDER_WORKERS = int(os.environ.get('PORTFOLIO_RENDER_WORKERS',
+                                    os.cpu_count() or 1))
+
+# Points kept per line; a chart is only a few thousand pixels wide, so longer
+# series are downsampled before they are drawn
+MAX_POINTS = 2000
+DOWNSAMPLE_METHOD = 'lttb'
+
+FIGURE_SIZE = (10, 6)
+DPI = 100
+
+
+def lttb(x, y, threshold):
+    """Return the indices of the points kept by Largest-Triangle-Three-Buckets
+    downsampling, which keeps the visual shape of a line (its peaks and
+    troughs) in `threshold` points"""
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+
+        # Average of the next bucket, the third point of each triangle
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        # Keep the point making the largest triangle with the previous point
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    selected[-1] = n - 1
+    return selected
+
+
+def min_max(y, buckets):
+    """Return the indices of the minimum and maximum of each of `buckets`
+    equal buckets, plus the first and last points, in order"""
+    n = y.size
+    if 2 * buckets + 2 >= n:
+        return np.arange(n)
+
+    size = n // buckets
+    grouped = y[:size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+
+    selected = np.concatenate([[0, n - 1],
+                               offsets + np.argmin(grouped, axis=1),
+                               offsets + np.argmax(grouped, axis=1)])
+    return np.unique(selected)
+
+
+def downsample(df, max_points=MAX_POINTS, method=DOWNSAMPLE_METHOD):
+    """Return the rows of a (date x line) dataframe needed to draw each line
+    with at most max_points points"""
+    if len(df) <= max_points:
+        return df
+
+    x = df.index.values.astype('datetime64[ns]').astype(np.int64) \
+        .astype(float) if isinstance(df.index, pd.DatetimeIndex) \
+        else np.arange(len(df), dtype=float)
+
+    # Gaps don't affect which points are chosen
+    keep = []
+    for column in df.columns:
+        y = np.nan_to_num(df[column].values.astype(float))
+        if method == 'minmax':
+            keep.append(min_max(y, max_points // 2 - 1))
+        else:
+            keep.append(lttb(x, y, max_points))
+
+    return df.iloc[np.unique(np.concatenate(keep))]
+
+
+def render_chart(df, path, title="Portfolio value", ylabel="Value",
+                 max_points=MAX_POINTS):
+    """Draw the columns of df as lines and save the chart to path. The file
+    format (e.g. PNG or SVG) follows the extension."""
+    # A Figure on its own Agg canvas rather than pyplot, so no GUI state is
+    # created and the process wide backend is left alone
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    df = downsample(df, max_points)
+
+    figure = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+    FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    for column in df.columns:
+        ax.plot(df.index, df[column].values, label=str(column))
+    ax.set_title(title, fontsize=14)
+    ax.set_xlabel("Date")
+    ax.set_ylabel(ylabel)
+    if len(df.columns) > 1:
+        ax.legend()
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    figure.savefig(path)
+    return path
+
+
+def chart_path(title):
+    """Return the default path of a chart, e.g. charts/portfolio-value.png"""
+    name = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-') or 'chart'
+    return os.path.join(CHART_DIRECTORY,
+                        '{}.{}'.format(name, CHART_FORMAT))
+
+
+def plot_data(df, ylabel="Value", title="Portfolio value", path=None):
+    """Save a chart of the columns of df, shared by the portfolio scripts. The
+    format (PNG or SVG) follows the extension of path, which defaults to
+    chart_path(title). Returns the path written."""
+    if path is None:
+        path = chart_path(title)
+        print('Saved chart to {}'.format(path))
+    return render_chart(df, path, title=title, ylabel=ylabel)
+
+
+def render_one(chart):
+    return render_chart(**chart)
+
+
+def render_all(charts, workers=None, max_points=MAX_POINTS):
+    """Render many charts in parallel worker processes.
+
+    Charts is a list of dicts of render_chart arguments, each with at least a
+    df and a path. Series are downsampled before they are sent to the workers.
+    Returns the paths written."""
+    workers = RENDER_WORKERS if workers is None else workers
+    charts = [dict(chart, df=downsample(chart['df'], max_points),
+                   max_points=max_points) for chart in charts]
+
+    if workers <= 1 or len(charts) <= 1:
+        return [render_one(chart) for chart in charts]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_one, charts,
+                             chunksize=max(1, len(charts) // (workers * 4))))
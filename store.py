@@ -0,0 +1,132 @@
+import os
+import pandas as pd
+import file
+import warehouse
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Backend used to read stored prices and forex: 'feather', 'csv' or
+# 'warehouse'. The CSV files written by the downloaders stay the source of
+# truth; feather files are built from them the first time they are read and
+# whenever they change. The warehouse is filled by the downloaders (and by
+# warehouse.import_legacy for existing files).
+STORE_FORMAT = os.environ.get('PORTFOLIO_STORE', 'feather')
+
+
+def use_feather():
+    return STORE_FORMAT == 'feather' and feather is not None
+
+
+def backend():
+    """Return the backend stored histories are actually read from"""
+    if STORE_FORMAT == 'warehouse':
+        return 'warehouse'
+    return 'feather' if use_feather() else 'csv'
+
+
+def read_csv_frame(path):
+    """Read a stored CSV into a dataframe indexed by (timezone naive) date.
+    Files in any of the warehouse's legacy layouts (e.g. Xignite's
+    GlobalQuotes Last) are read with the common field names (e.g. Close)."""
+    return warehouse.read_legacy_csv(path)
+
+
+def write_feather_frame(df, path):
+    """Write a date indexed dataframe as an uncompressed feather file, so it can
+    be memory-mapped without decoding"""
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    temp_path = path + '.tmp'
+    feather.write_feather(table, temp_path, compression='uncompressed')
+    os.replace(temp_path, path)
+
+
+def asof_start(dates, start):
+    """Return the last of the sorted dates on or before start, or start if
+    there is none"""
+    position = dates.searchsorted(pd.Timestamp(start), side='right') - 1
+    return dates[position] if position >= 0 else start
+
+
+def slice_dates(df, start=None, end=None, asof=False):
+    """Return the rows of a date indexed frame between start and end
+    (inclusive, either may be None). With asof set, the rows start at the
+    last date on or before start, so the quote in effect on the start date is
+    included."""
+    if start is None and end is None:
+        return df
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    if asof and start is not None:
+        start = asof_start(df.index, start)
+    return df.loc[start:end]
+
+
+def read_feather_frame(path, columns=None, start=None, end=None, asof=False):
+    if columns is not None:
+        columns = ['Date'] + list(columns)
+    table = feather.read_table(path, columns=columns, memory_map=True)
+
+    # Only convert the rows in the date range. The file is memory-mapped, so
+    # slicing the table doesn't read the other rows at all.
+    if start is not None or end is not None:
+        dates = pd.DatetimeIndex(table.column('Date').to_numpy())
+        if dates.is_monotonic_increasing:
+            if start is not None and asof:
+                start = asof_start(dates, start)
+            first = 0 if start is None else dates.searchsorted(
+                pd.Timestamp(start), side='left')
+            last = dates.size if end is None else dates.searchsorted(
+                pd.Timestamp(end), side='right')
+            table = table.slice(first, max(last - first, 0))
+            start = end = None
+
+    return slice_dates(table.to_pandas().set_index('Date'), start, end, asof)
+
+
+def is_stale(path, source_path):
+    """Return whether path is missing or older than the file it was built from"""
+    try:
+        return os.stat(path).st_mtime_ns < os.stat(source_path).st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+
+def read_frame(name, parent_dir=file.PRICES_DIRECTORY, columns=None,
+               start=None, end=None, asof=False):
+    """Return the stored history for name as a dataframe indexed by date,
+    optionally only the rows between the start and end dates. With asof set,
+    the rows start at the last one on or before the start date, e.g. the
+    monthly bar a mid-month start falls in.
+
+    Raises FileNotFoundError if nothing is stored for name."""
+    if STORE_FORMAT == 'warehouse':
+        return warehouse.read_history(name, columns, start, end,
+                                      dataset=parent_dir, asof=asof)
+
+    csv_path = file.make_path(name, parent_dir)
+
+    if not use_feather():
+        df = slice_dates(read_csv_frame(csv_path), start, end, asof)
+        return df if columns is None else df[list(columns)]
+
+    feather_path = file.make_path(name, parent_dir, 'feather')
+
+    if not os.path.exists(csv_path):
+        # Feather files can also be used on their own
+        if os.path.exists(feather_path):
+            return read_feather_frame(feather_path, columns, start, end,
+                                      asof)
+        raise FileNotFoundError(csv_path)
+
+    # Migrate CSVs the first time they are read, or after they are updated
+    if is_stale(feather_path, csv_path):
+        df = read_csv_frame(csv_path)
+        write_feather_frame(df, feather_path)
+        df = slice_dates(df, start, end, asof)
+        return df if columns is None else df[list(columns)]
+
+    return read_feather_frame(feather_path, columns, start, end, asof)
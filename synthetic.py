@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pandas as pd
+import file
+import forex
+
+# Currencies given to the synthetic symbols in turn, the first being the base
+CURRENCIES = ['USD', 'AUD', 'EUR', 'GBP', 'JPY', 'CAD', 'CHF', 'NZD']
+
+TRADING_DAYS_PER_YEAR = 260
+
+
+def make_dates(years, end='2020-01-01'):
+    return pd.bdate_range(end=end, periods=years * TRADING_DAYS_PER_YEAR)
+
+
+def make_symbols(num_symbols):
+    return ['S{:05d}'.format(i) for i in range(num_symbols)]
+
+
+def random_walk(rng, num_dates, num_series, start=10.0, volatility=0.01):
+    """Return a (date x series) array of positive random walks"""
+    returns = rng.normal(0, volatility, size=(num_dates, num_series))
+    return start * np.exp(np.cumsum(returns, axis=0))
+
+
+def write_history(path, dates, closes):
+    df = pd.DataFrame({'Date': dates.strftime('%Y-%m-%d'), 'Close': closes})
+    df.to_csv(path, index=False, float_format='%.6f')
+
+
+def make_prices(symbols, dates, seed=0):
+    """Make a (date x symbol) frame of random walk closes"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(random_walk(rng, dates.size, len(symbols)),
+                        index=dates, columns=symbols)
+
+
+def write_prices(symbols, dates, seed=0):
+    """Write a daily price history csv for every symbol, laid out like the
+    yfinance downloads. Returns the (date x symbol) closes."""
+    prices = make_prices(symbols, dates, seed=seed)
+
+    for symbol in symbols:
+        write_history(file.make_path(symbol), dates, prices[symbol].values)
+
+    return prices
+
+
+def write_forex(currencies, dates, base=forex.BASE_CURRENCY, seed=1):
+    """Write a rate history csv for each currency against the base"""
+    rng = np.random.default_rng(seed)
+    others = [currency for currency in currencies if currency != base]
+    rates = random_walk(rng, dates.size, len(others), start=1.0,
+                        volatility=0.005)
+
+    for column, currency in enumerate(others):
+        path = file.make_path(currency + base, forex.FOREX_DIRECTORY)
+        write_history(path, dates, rates[:, column])
+
+
+def make_trades(num_trades, prices, currencies, seed=2):
+    """Make random buy/sell trades at the close on each trade date. Each
+    symbol is always traded in the same currency."""
+    rng = np.random.default_rng(seed)
+    symbols = prices.columns
+    rows = np.sort(rng.integers(0, prices.index.size, size=num_trades))
+    columns = rng.integers(0, symbols.size, size=num_trades)
+    quantities = rng.integers(1, 1000, size=num_trades).astype(float)
+
+    # Shares is read by the single currency scripts, Quantity by the
+    # multi-currency ones
+    return pd.DataFrame({
+        'Symbol': symbols[columns],
+        'Type': np.where(rng.random(num_trades) < 0.7, 'Buy', 'Sell'),
+        'Date': prices.index[rows],
+        'Currency': np.asarray(currencies)[columns % len(currencies)],
+        'Shares': quantities,
+        'Quantity': quantities,
+        'Price': prices.values[rows, columns].round(4),
+        'Commission': 9.95,
+    })
+
+
+def write_trades(trades):
+    trades.to_csv(file.make_path('trades', ''), index=False,
+                  date_format='%Y-%m-%d')
+
+
+def generate(directory, num_symbols=100, years=10, num_trades=10000,
+             num_currencies=3, seed=0):
+    """Write a complete synthetic data directory (trades, prices and forex)
+    and point file.DATA_DIRECTORY at it"""
+    file.DATA_DIRECTORY = directory
+    os.makedirs(directory, exist_ok=True)
+
+    currencies = CURRENCIES[:num_currencies]
+    dates = make_dates(years)
+    prices = write_prices(make_symbols(num_symbols), dates, seed=seed)
+    write_forex(currencies, dates, seed=seed + 1)
+    write_trades(make_trades(num_trades, prices, currencies, seed=seed + 2))
+
+    return dates
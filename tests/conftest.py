@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import file
+
+
+@pytest.fixture
+def data_directory(tmp_path, monkeypatch):
+    """Point every reader and writer at an empty data directory, with nothing
+    cached from another one"""
+    monkeypatch.setattr(file, 'DATA_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(cache, 'memory_cache', OrderedDict())
+    return tmp_path
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delays.get(self.path, 0))
+
+        # Each request takes the next response queued for its path, and the
+        # last one is repeated
+        queue = self.server.responses.get(self.path, [(404, b'')])
+        status, body, *sent = queue.pop(0) if len(queue) > 1 else queue[0]
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # Sending only part of the body drops the connection mid-stream
+        self.wfile.write(body[:sent[0]] if sent else body)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """A local stand-in HTTP server. Queue (status, body) responses, or
+    (status, body, bytes sent) to drop the connection part way through the
+    body, in server.responses[request path]. server.delays[request path]
+    stalls the response for that many seconds."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.responses = {}
+    server.delays = {}
+    server.requests = []
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import analytics
+
+
+def test_rolling_volatility_of_offset_returns_is_exact():
+    rng = np.random.default_rng(0)
+    returns = 1e6 + rng.normal(0, 0.01, size=(500, 2))
+
+    volatility = analytics.rolling_volatility(returns, window=20,
+                                              periods_per_year=1)
+
+    # Each window's standard deviation computed on its own
+    expected = np.array([returns[end - 20:end].std(axis=0, ddof=1)
+                         for end in range(20, 501)])
+    np.testing.assert_allclose(volatility[19:], expected, rtol=1e-6)
+    assert np.isnan(volatility[:19]).all()
+
+
+def test_missing_returns_only_affect_their_own_windows():
+    returns = np.random.default_rng(1).normal(0, 0.01, size=100)
+    returns[10] = np.nan
+
+    volatility = analytics.rolling_volatility(returns, window=5)[:, 0]
+
+    assert np.isnan(volatility[10:15]).all()
+    assert not np.isnan(volatility[15:]).any()
+
+
+def test_periods_per_year_follows_the_dates():
+    months = pd.date_range('2016-01-01', '2019-01-01', freq='MS')
+    weeks = pd.date_range('2016-01-01', '2019-01-01', freq='W')
+
+    assert round(analytics.infer_periods_per_year(months)) == 12
+    assert round(analytics.infer_periods_per_year(weeks)) == 52
+    assert analytics.infer_periods_per_year(np.arange(10)) == \
+        analytics.PERIODS_PER_YEAR
+
+
+def test_money_weighted_return_is_annualised_by_the_dates():
+    # 1% a month compounds to about 12.7% a year
+    dates = pd.date_range('2016-01-01', '2017-01-01', freq='MS')
+    values = pd.Series(100 * 1.01 ** np.arange(len(dates)), index=dates)
+    flows = pd.Series(0.0, index=dates)
+    flows.iloc[0] = 100
+
+    rate = analytics.money_weighted_return(values, flows)
+
+    np.testing.assert_allclose(rate, 1.01 ** 12 - 1, rtol=1e-2)
+
+
+def test_deposits_are_not_returns():
+    dates = pd.date_range('2016-01-01', periods=6, freq='MS')
+    df = pd.DataFrame({'Portfolio': [1000.0, 1000, 2000, 2000, 2000, 2000],
+                       'Benchmark': [1000.0, 1100, 2100, 2100, 2100, 2100]},
+                      index=dates)
+    flows = np.array([1000.0, 0, 1000, 0, 0, 0])
+
+    report = analytics.risk_report(df, flows=flows)
+
+    assert report.loc['Portfolio', 'Return'] == 0
+    assert report.loc['Portfolio', 'Max drawdown'] == 0
+    assert analytics.time_weighted_return(df['Portfolio'], flows)[0] == 0
+
+
+def test_sortino_ratio_without_downside_is_undefined():
+    with np.errstate(all='raise'):
+        ratio = analytics.sortino_ratio(np.array([0.01, 0.02, 0.03]))
+
+    assert np.isnan(ratio).all()
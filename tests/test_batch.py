@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import batch
+import holdings
+import synthetic
+
+BENCHMARK = '^AXJO'
+
+
+def make_ledgers(num_accounts=5):
+    dates = synthetic.make_dates(1)
+    symbols = synthetic.make_symbols(50)
+    prices = synthetic.make_prices([BENCHMARK] + symbols, dates)
+
+    # A gap in a held price leaves the value missing on that date
+    prices.iloc[100, 1:] = np.nan
+
+    ledgers = {}
+    for account in range(num_accounts):
+        # Each account only trades a few of the symbols
+        traded = symbols[account * 3:account * 3 + 3]
+        ledgers['Account {}'.format(account)] = synthetic.make_trades(
+            40, prices[traded], ['USD'], seed=account)
+    return ledgers, prices
+
+
+def test_matches_valuing_each_account_alone():
+    ledgers, prices = make_ledgers()
+
+    values = batch.value_portfolios(ledgers, prices, benchmark_symbol=BENCHMARK,
+                                    workers=1, chunk_size=2)
+
+    for name, trades in ledgers.items():
+        alone = holdings.get_portfolio_value_over_time(
+            trades, prices, benchmark_symbol=BENCHMARK)
+        np.testing.assert_allclose(values[name].values, alone.values)
+    assert values.xs('Portfolio', axis=1, level=1).iloc[100].isna().all()
+
+
+def test_chunks_fit_in_the_memory_limit(monkeypatch):
+    ledgers, prices = make_ledgers()
+    trades = pd.concat(ledgers.values())
+    tensor_size = prices.index.size * trades['Symbol'].nunique() * 8
+
+    monkeypatch.setattr(batch, 'TENSOR_MEMORY_LIMIT', 3 * tensor_size)
+    assert batch.fit_chunk_size(trades, prices, 64) == 3
+
+    monkeypatch.setattr(batch, 'TENSOR_MEMORY_LIMIT', 0)
+    assert batch.fit_chunk_size(trades, prices, 64) == 1
@@ -0,0 +1,36 @@
+import numpy as np
+import benchmark
+import holdings
+import synthetic
+
+
+def make_data():
+    dates = synthetic.make_dates(1)
+    symbols = synthetic.make_symbols(5)
+    prices = synthetic.make_prices(['^AXJO', '^GSPC'] + symbols, dates)
+    trades = synthetic.make_trades(100, prices[symbols], ['USD'])
+    return trades, prices
+
+
+def test_portfolio_benchmark_column_comes_from_the_benchmark_engine():
+    trades, prices = make_data()
+
+    values = holdings.get_portfolio_value_over_time(trades, prices,
+                                                    benchmark_symbol='^AXJO')
+    expected = benchmark.get_benchmark_values(trades, prices, '^AXJO')
+
+    np.testing.assert_allclose(values['Benchmark'].values,
+                               expected['^AXJO'].values)
+
+
+def test_blends_are_the_weighted_sum_of_their_legs():
+    trades, prices = make_data()
+
+    values = benchmark.get_benchmark_values(trades, prices, {
+        'ASX': '^AXJO', 'S&P': '^GSPC',
+        'Blend': {'^AXJO': 0.6, '^GSPC': 0.4}})
+
+    np.testing.assert_allclose(values['Blend'].values,
+                               0.6 * values['ASX'].values +
+                               0.4 * values['S&P'].values)
+    assert list(values.columns) == ['ASX', 'S&P', 'Blend']
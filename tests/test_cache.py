@@ -0,0 +1,34 @@
+import pandas as pd
+import cache
+import store
+
+
+def test_reuses_the_value_while_files_are_unchanged(data_directory):
+    path = data_directory / 'prices.csv'
+    path.write_text('Date,Close\n')
+    dates = pd.date_range('2020-01-01', periods=3)
+    builds = []
+
+    def build():
+        builds.append(len(builds))
+        return len(builds)
+
+    assert cache.cached('test', ['A'], dates, [str(path)], build) == 1
+    assert cache.cached('test', ['A'], dates, [str(path)], build) == 1
+
+    path.write_text('Date,Close\n2020-01-01,1.0\n')
+    assert cache.cached('test', ['A'], dates, [str(path)], build) == 2
+
+
+def test_store_backends_are_cached_separately(data_directory, monkeypatch):
+    dates = pd.date_range('2020-01-01', periods=3)
+
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    assert cache.cached('test', ['A'], dates, [], lambda: 'csv') == 'csv'
+
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'warehouse')
+    assert cache.cached('test', ['A'], dates, [],
+                        lambda: 'warehouse') == 'warehouse'
+
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    assert cache.cached('test', ['A'], dates, [], lambda: 'rebuilt') == 'csv'
@@ -0,0 +1,67 @@
+import os
+import pytest
+import requests
+import download
+
+BODY = b'Date,Close\n2017-07-13,10.0\n2017-07-14,10.5\n'
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download, 'BACKOFF_BASE', 0)
+
+
+def fetch(http_server, tmp_path, retries=2):
+    path = str(tmp_path / 'prices.csv')
+    with download.make_session() as session:
+        download.fetch_to_file(session, http_server.url + '/prices', path,
+                               retries=retries)
+    return path
+
+
+def test_retries_server_errors(http_server, tmp_path):
+    http_server.responses['/prices'] = [(503, b''), (200, BODY)]
+
+    path = fetch(http_server, tmp_path)
+
+    assert open(path, 'rb').read() == BODY
+    assert len(http_server.requests) == 2
+
+
+def test_retries_a_body_dropped_mid_stream(http_server, tmp_path):
+    http_server.responses['/prices'] = [(200, BODY, 10), (200, BODY)]
+
+    path = fetch(http_server, tmp_path)
+
+    assert open(path, 'rb').read() == BODY
+    assert len(http_server.requests) == 2
+    assert not os.path.exists(path + '.part')
+
+
+def test_gives_up_without_leaving_a_partial_file(http_server, tmp_path):
+    http_server.responses['/prices'] = [(200, BODY, 10)]
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        fetch(http_server, tmp_path, retries=1)
+
+    assert len(http_server.requests) == 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_client_errors_are_not_retried(http_server, tmp_path):
+    http_server.responses['/prices'] = [(404, b'')]
+
+    with pytest.raises(requests.HTTPError):
+        fetch(http_server, tmp_path)
+
+    assert len(http_server.requests) == 1
+
+
+def test_rate_limiter_spaces_out_each_key():
+    limiter = download.RateLimiter(10)
+
+    delays = [limiter.reserve('a') for _ in range(3)]
+
+    assert delays[0] == 0
+    assert 0.15 < delays[2] <= 0.2
+    assert limiter.reserve('b') == 0
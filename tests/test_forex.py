@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import forex
+import file
+
+
+def write_pair(pair, rows):
+    with open(file.make_path(pair, forex.FOREX_DIRECTORY), 'w') as handle:
+        handle.write('Date,Close\n')
+        for date, close in rows:
+            handle.write(f'{date},{close}\n')
+
+
+def test_direct_pair(data_directory):
+    write_pair('AUDUSD', [('2020-01-01', 0.7), ('2020-01-03', 0.75)])
+
+    rate = forex.read_rate('AUD', 'USD', forex.available_pairs())
+    assert rate.tolist() == [0.7, 0.75]
+
+
+def test_inverse_pair(data_directory):
+    write_pair('USDJPY', [('2020-01-01', 100.0), ('2020-01-02', 125.0)])
+
+    rate = forex.read_rate('JPY', 'USD', forex.available_pairs())
+    assert rate.tolist() == [0.01, 0.008]
+
+
+def test_triangulates_through_another_currency(data_directory):
+    write_pair('AUDEUR', [('2020-01-01', 0.5), ('2020-01-03', 0.6)])
+    write_pair('USDEUR', [('2020-01-02', 0.8)])
+
+    rate = forex.read_rate('AUD', 'USD', forex.available_pairs())
+
+    # Each rate is carried forward to the dates only the other changed on,
+    # and the day before USDEUR was first quoted has no rate
+    assert rate.index.strftime('%Y-%m-%d').tolist() == ['2020-01-02',
+                                                        '2020-01-03']
+    np.testing.assert_allclose(rate.values, [0.5 / 0.8, 0.6 / 0.8])
+
+
+def test_rates_before_the_first_quote(data_directory):
+    write_pair('AUDUSD', [('2020-01-02', 0.7)])
+    matrix = forex.build_rate_matrix(['USD', 'AUD'])
+
+    rates = forex.rates_asof(matrix, pd.to_datetime(['2020-01-01',
+                                                     '2020-01-05']))
+    assert rates['USD'].tolist() == [1.0, 1.0]
+    assert np.isnan(rates['AUD'].iloc[0])
+    assert rates['AUD'].iloc[1] == 0.7
+
+
+def test_convert_unknown_currency(data_directory):
+    write_pair('AUDUSD', [('2020-01-01', 0.5)])
+    matrix = forex.build_rate_matrix(['USD', 'AUD'])
+
+    converted = forex.convert([10.0, 10.0, 10.0],
+                              pd.to_datetime(['2020-01-02'] * 3),
+                              ['USD', 'AUD', 'GBP'], matrix)
+    assert converted[:2].tolist() == [10.0, 5.0]
+    assert np.isnan(converted[2])
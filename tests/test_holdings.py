@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import holdings
+
+DATES = pd.date_range('2020-01-01', periods=4)
+
+
+def make_prices():
+    return pd.DataFrame({'AAA': [1.0, 2.0, 3.0, 4.0],
+                         'BBB': [10.0, 10.0, 20.0, 20.0]}, index=DATES)
+
+
+def make_trades():
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-03']),
+        'Symbol': ['AAA', 'BBB', 'AAA'],
+        'Type': ['Buy', 'Buy', 'Sell'],
+        'Currency': ['USD', 'AUD', 'USD'],
+        'Quantity': [10.0, 1.0, 5.0],
+    })
+
+
+def make_forex():
+    return pd.DataFrame({'USD': 1.0, 'AUD': 0.5}, index=DATES)
+
+
+def test_converted_value():
+    values = holdings.get_converted_value_over_time(
+        make_trades(), make_prices(), make_forex())
+
+    assert values['Portfolio'].tolist() == [10.0, 25.0, 25.0, 30.0]
+
+
+def test_chunked_trades_match_one_frame():
+    trades = make_trades()
+    chunks = [trades.iloc[:1], trades.iloc[1:]]
+
+    pd.testing.assert_frame_equal(
+        holdings.get_converted_value_over_time(chunks, make_prices(),
+                                               make_forex()),
+        holdings.get_converted_value_over_time(trades, make_prices(),
+                                               make_forex()))
+
+
+def test_no_trade_chunks_have_no_value():
+    values = holdings.get_converted_value_over_time(iter([]), make_prices(),
+                                                    make_forex())
+
+    assert np.array_equal(values['Portfolio'].values, np.zeros(len(DATES)))
+
+
+def test_chunks_with_new_symbols_match_one_frame():
+    dates = pd.date_range('2020-01-01', periods=30)
+    symbols = ['S{}'.format(i) for i in range(40)]
+    prices = pd.DataFrame(np.arange(1.0, 1201.0).reshape(30, 40),
+                          index=dates, columns=symbols)
+    rng = np.random.default_rng(0)
+    trades = pd.DataFrame({
+        'Date': dates[rng.integers(0, 30, size=200)],
+        'Symbol': np.array(symbols)[rng.integers(0, 40, size=200)],
+        'Type': 'Buy',
+        'Shares': rng.integers(1, 100, size=200).astype(float),
+        'Price': 1.0,
+    })
+
+    # Each chunk brings in symbols the tensor hasn't seen yet
+    chunks = [trades[i:i + 7] for i in range(0, len(trades), 7)]
+
+    np.testing.assert_allclose(
+        holdings.get_portfolio_value_over_time(chunks, prices).values,
+        holdings.get_portfolio_value_over_time(trades, prices).values)
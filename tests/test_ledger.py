@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import ledger
+
+
+def test_float32_round_trip_closes_the_interval():
+    trades = pd.DataFrame({
+        'Date': pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-03']),
+        'Symbol': ['AAA', 'AAA', 'AAA'],
+        'Type': ['Buy', 'Buy', 'Sell'],
+        'Quantity': np.array([0.1, 0.2, 0.3], dtype=np.float32),
+    })
+    intervals = ledger.TradeIndex(trades).holding_intervals()
+    assert intervals['End'].tolist() == [pd.Timestamp('2020-01-03')]
+
+
+def make_trades():
+    # Out of date order, to check the index sorts them
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2020-01-05', '2020-01-01', '2020-01-02',
+                                '2020-01-03', '2020-01-04', '2020-01-06',
+                                '2020-01-06']),
+        'Symbol': ['AAA', 'AAA', 'BBB', 'AAA', 'AAA', 'AAA', 'AAA'],
+        'Type': ['Buy', 'Buy', 'Buy', 'Sell', 'Buy', 'Sell', 'Buy'],
+        'Currency': ['USD', 'USD', 'AUD', 'USD', 'USD', 'USD', 'USD'],
+        'Quantity': [5.0, 10.0, 3.0, 10.0, 2.0, 7.0, 1.0],
+    })
+
+
+def test_summary():
+    summary = ledger.TradeIndex(make_trades()).summary()
+
+    assert summary.index.tolist() == ['AAA', 'BBB']
+    assert summary['First'].tolist() == list(pd.to_datetime(
+        ['2020-01-01', '2020-01-02']))
+    assert summary['Last'].tolist() == list(pd.to_datetime(
+        ['2020-01-06', '2020-01-02']))
+    assert summary['Trades'].tolist() == [6, 1]
+    assert summary['Net'].tolist() == [1.0, 3.0]
+
+
+def test_slices_are_in_date_order():
+    index = ledger.TradeIndex(make_trades())
+
+    slices = dict(index.slices('Currency'))
+    assert list(slices) == ['USD', 'AUD']
+    assert slices['USD']['Date'].is_monotonic_increasing
+    assert slices['USD']['Quantity'].tolist() == [10.0, 10.0, 2.0, 5.0, 7.0,
+                                                  1.0]
+    assert index.slice('BBB')['Quantity'].tolist() == [3.0]
+
+
+def test_holding_intervals_pair_each_open_with_its_close():
+    intervals = ledger.TradeIndex(make_trades()).holding_intervals()
+
+    # AAA is sold out on the 3rd and bought back on the 4th. Selling out and
+    # buying back on the 6th doesn't close it, as only the end of day counts
+    assert intervals['Symbol'].tolist() == ['AAA', 'AAA', 'BBB']
+    assert intervals['Start'].tolist() == list(pd.to_datetime(
+        ['2020-01-01', '2020-01-04', '2020-01-02']))
+    assert intervals['End'].iloc[0] == pd.Timestamp('2020-01-03')
+    assert intervals['End'].iloc[1:].isna().all()
+
+
+def test_holding_intervals_close_in_their_own_group():
+    trades = pd.DataFrame({
+        'Date': pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-03']),
+        'Symbol': ['AAA', 'BBB', 'BBB'],
+        'Type': ['Buy', 'Buy', 'Sell'],
+        'Quantity': [1.0, 1.0, 1.0],
+    })
+    intervals = ledger.TradeIndex(trades).holding_intervals()
+
+    assert intervals.set_index('Symbol')['End'].to_dict() == {
+        'AAA': pd.NaT, 'BBB': pd.Timestamp('2020-01-03')}
+
+
+def test_holding_spans():
+    spans = ledger.TradeIndex(make_trades()).holding_spans()
+
+    assert spans.loc['AAA', 'Start'] == pd.Timestamp('2020-01-01')
+    assert pd.isna(spans.loc['AAA', 'End'])
+    assert spans.loc['BBB', 'Start'] == pd.Timestamp('2020-01-02')
+
+
+def test_grouped_spans():
+    trades = make_trades()
+    trades.loc[len(trades)] = [pd.Timestamp('2019-12-01'), 'CCC', 'Buy',
+                               'AUD', 1.0]
+    trades.loc[len(trades)] = [pd.Timestamp('2019-12-15'), 'CCC', 'Sell',
+                               'AUD', 1.0]
+    trades.loc[len(trades)] = [pd.Timestamp('2019-11-01'), 'DDD', 'Buy',
+                               'EUR', 1.0]
+    trades.loc[len(trades)] = [pd.Timestamp('2019-11-10'), 'DDD', 'Sell',
+                               'EUR', 1.0]
+
+    spans = ledger.TradeIndex(trades).grouped_spans('Currency')
+
+    assert spans.loc['AUD', 'Start'] == pd.Timestamp('2019-12-01')
+    assert pd.isna(spans.loc['AUD', 'End'])
+    assert spans.loc['EUR', 'End'] == pd.Timestamp('2019-11-10')
+
+
+def test_held_between():
+    intervals = pd.DataFrame({
+        'Symbol': ['AAA', 'BBB', 'CCC'],
+        'Start': pd.to_datetime(['2020-01-01', '2020-02-01', '2020-03-01']),
+        'End': pd.to_datetime(['2020-01-10', None, '2020-03-05']),
+    })
+    held = ledger.held_between(intervals, pd.Timestamp('2020-01-05'),
+                               pd.Timestamp('2020-02-15'))
+
+    assert held['Symbol'].tolist() == ['AAA', 'BBB']
+    assert held['Start'].tolist() == list(pd.to_datetime(
+        ['2020-01-05', '2020-02-01']))
+    assert held['End'].tolist() == list(pd.to_datetime(
+        ['2020-01-10', '2020-02-15']))
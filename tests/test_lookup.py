@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import lookup
+
+
+def make_index():
+    return lookup.PriceIndex.from_series({
+        'AAA': pd.Series([1.0, 2.0, 3.0], index=pd.to_datetime(
+            ['2020-01-01', '2020-01-03', '2020-01-06'])),
+        'BBB': pd.Series([10.0, np.nan, 30.0], index=pd.to_datetime(
+            ['2020-01-02', '2020-01-03', '2020-01-04'])),
+    })
+
+
+def test_asof_uses_the_latest_quote_on_or_before_each_date():
+    dates = pd.to_datetime(['2019-12-31', '2020-01-01', '2020-01-04',
+                            '2020-01-10'])
+
+    np.testing.assert_array_equal(make_index().asof('AAA', dates),
+                                  [np.nan, 1.0, 2.0, 3.0])
+
+
+def test_asof_pairs_matches_asof_per_symbol():
+    rng = np.random.default_rng(0)
+    symbols = rng.choice(['AAA', 'BBB', 'CCC'], size=200)
+    dates = pd.Timestamp('2019-12-30') + pd.to_timedelta(
+        rng.integers(0, 10, size=200), unit='D')
+    index = make_index()
+
+    prices = index.asof_pairs(symbols, dates)
+
+    for symbol in ['AAA', 'BBB']:
+        rows = symbols == symbol
+        np.testing.assert_array_equal(prices[rows],
+                                      index.asof(symbol, dates[rows]))
+    assert np.isnan(prices[symbols == 'CCC']).all()
+
+
+def test_matrix_fills_gaps_with_the_latest_quote():
+    dates = pd.date_range('2020-01-01', '2020-01-07')
+
+    matrix = make_index().matrix(dates, ['AAA', 'BBB'])
+
+    assert matrix['AAA'].tolist() == [1.0, 1.0, 2.0, 2.0, 2.0, 3.0, 3.0]
+    assert matrix['BBB'].tolist()[1:] == [10.0, 10.0, 30.0, 30.0, 30.0, 30.0]
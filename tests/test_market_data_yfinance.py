@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import cli
+
+yfinance = cli.load('market-data-yfinance')
+
+
+def write_stored(path, closes):
+    pd.DataFrame({'Date': ['2020-01-01', '2020-02-01', '2020-03-01'],
+                  'Close': closes}).to_csv(path, index=False)
+
+
+def fetched(closes):
+    return pd.DataFrame({'Close': closes}, index=pd.DatetimeIndex(
+        ['2020-02-01', '2020-03-01', '2020-04-01'], name='Date'))
+
+
+def test_appends_when_the_overlap_matches(tmp_path):
+    path = str(tmp_path / 'ABC.csv')
+    write_stored(path, [1.0, 2.0, 3.0])
+    _, stored = yfinance.plan_fetch(path, '2020-01-01')
+
+    assert yfinance.store_history('ABC', path, fetched([2.0, 3.5, 4.0]),
+                                  stored)
+    assert pd.read_csv(path)['Close'].tolist() == [1.0, 2.0, 3.5, 4.0]
+
+
+def test_detects_adjusted_closes(tmp_path):
+    path = str(tmp_path / 'ABC.csv')
+    write_stored(path, [1.0, 2.0, 3.0])
+    _, stored = yfinance.plan_fetch(path, '2020-01-01')
+
+    assert not yfinance.store_history('ABC', path, fetched([1.9, 3.5, 4.0]),
+                                      stored)
+
+
+def test_empty_forex_closes_are_not_adjustments(tmp_path):
+    path = str(tmp_path / 'AUDUSD.csv')
+    write_stored(path, [0.7, np.nan, 0.68])
+    _, stored = yfinance.plan_fetch(path, '2020-01-01')
+
+    assert yfinance.store_history('AUDUSD=X', path,
+                                  fetched([np.nan, 0.69, 0.7]), stored)
+    assert len(pd.read_csv(path)) == 4
+
+
+def stub_fetch_batch(monkeypatch):
+    requests = []
+
+    def fetch_batch(tickers, start_date, end_date, interval):
+        requests.append((list(tickers), start_date, end_date))
+        return {ticker: start_date for ticker in tickers}
+
+    monkeypatch.setattr(yfinance, 'fetch_batch', fetch_batch)
+    return requests
+
+
+def test_tickers_in_the_same_month_share_a_request(monkeypatch):
+    requests = stub_fetch_batch(monkeypatch)
+
+    histories = yfinance.fetch_grouped([
+        ('AAA', '2020-01-15', '2020-06-01'),
+        ('BBB', '2020-01-02', '2020-06-01'),
+        ('CCC', '2020-01-02', '2020-07-01'),
+        ('DDD', '2020-02-01', '2020-06-01'),
+    ])
+
+    assert requests == [(['AAA', 'BBB'], '2020-01-01', '2020-06-01'),
+                        (['CCC'], '2020-01-01', '2020-07-01'),
+                        (['DDD'], '2020-02-01', '2020-06-01')]
+    assert histories == {'AAA': '2020-01-01', 'BBB': '2020-01-01',
+                         'CCC': '2020-01-01', 'DDD': '2020-02-01'}
+
+
+def test_daily_bars_keep_their_start_date(monkeypatch):
+    requests = stub_fetch_batch(monkeypatch)
+
+    yfinance.fetch_grouped([('AAA', '2020-01-15', '2020-06-01'),
+                            ('BBB', '2020-01-02', '2020-06-01')], '1d')
+
+    assert [tickers for tickers, *_ in requests] == [['BBB'], ['AAA']]
+
+
+def test_batches_respect_the_batch_size(monkeypatch):
+    requests = stub_fetch_batch(monkeypatch)
+    monkeypatch.setattr(yfinance, 'BATCH_SIZE', 2)
+
+    tickers = ['T{}'.format(i) for i in range(5)]
+    histories = yfinance.fetch_grouped(
+        [(ticker, '2020-01-01', '2020-06-01') for ticker in tickers])
+
+    assert [batch for batch, *_ in requests] == [tickers[0:2], tickers[2:4],
+                                                 tickers[4:]]
+    assert list(histories) == tickers
@@ -0,0 +1,106 @@
+from functools import partial
+import numpy as np
+import pandas as pd
+import pytest
+import file
+import pipeline
+import store
+import synthetic
+import warehouse
+
+BENCHMARK = '^AXJO'
+
+
+@pytest.fixture
+def history(data_directory, monkeypatch):
+    """Write a year of weekday closes and buys on a few of them"""
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    dates = synthetic.make_dates(1, end='2019-12-31')
+    symbols = synthetic.make_symbols(3)
+    prices = synthetic.write_prices([BENCHMARK] + symbols, dates)
+
+    trades = synthetic.make_trades(20, prices[symbols], ['USD'])
+    trades['Type'] = 'Buy'
+    synthetic.write_trades(trades)
+    return trades
+
+
+@pytest.mark.parametrize('frequency', ['D', 'W', 'MS'])
+def test_dates_without_a_close_are_valued_at_the_last_one(history,
+                                                         frequency):
+    start = history['Date'].min()
+    analysis = pipeline.Analysis(frequency=frequency) \
+        .between(start, '2019-12-31').against(BENCHMARK)
+
+    values = analysis.value()
+
+    # Weekends (and every weekly date, a Sunday) have no close of their own
+    assert (values.index.dayofweek >= 5).any()
+    assert (values > 0).all().all()
+    assert (analysis.report()['Max drawdown'] > -1).all()
+
+
+def test_compact_prices_are_valued_at_the_last_close(history):
+    analysis = pipeline.Analysis(frequency='W') \
+        .between(history['Date'].min(), '2019-12-31')
+
+    np.testing.assert_allclose(analysis.compacted().value().values,
+                               analysis.value().values, rtol=1e-6)
+    assert (analysis.value() > 0).all().all()
+
+
+@pytest.mark.parametrize('backend', ['csv', 'feather', 'warehouse'])
+def test_monthly_bars_value_every_day_of_the_month(data_directory,
+                                                    monkeypatch, backend):
+    monkeypatch.setattr(store, 'STORE_FORMAT', backend)
+    months = pd.date_range('2017-12-01', '2018-06-01', freq='MS')
+    closes = pd.DataFrame({'Close': np.arange(10.0, 10.0 + months.size)},
+                          index=pd.DatetimeIndex(months, name='Date'))
+    closes.to_csv(file.make_path('AAA'))
+    warehouse.upsert({'AAA': closes})
+    synthetic.write_trades(pd.DataFrame({
+        'Symbol': ['AAA'], 'Type': ['Buy'],
+        'Date': pd.to_datetime(['2018-01-10']), 'Currency': ['USD'],
+        'Shares': [100.0], 'Quantity': [100.0], 'Price': [11.0],
+        'Commission': [0.0]}))
+
+    values = pipeline.Analysis(frequency='D') \
+        .between('2018-03-15', '2018-04-05').value()['Portfolio']
+
+    # The March bar is in effect until the April one
+    assert (values[:'2018-03-31'] == 1300).all()
+    assert (values['2018-04-01':] == 1400).all()
+
+
+def test_trades_keep_their_categories_across_chunks(history, monkeypatch):
+    expected = pipeline.Analysis(frequency='W').value()
+    monkeypatch.setattr(file, 'iter_trades_csv',
+                        partial(file.iter_trades_csv, chunksize=3))
+
+    trades = pipeline.read_trades()
+
+    assert isinstance(trades['Symbol'].dtype, pd.CategoricalDtype)
+    assert sorted(trades['Symbol'].unique()) == \
+        sorted(history['Symbol'].unique())
+    np.testing.assert_allclose(pipeline.Analysis(frequency='W').value(),
+                               expected)
+
+
+def test_benchmark_cash_is_converted_into_the_base_currency(data_directory,
+                                                            monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    dates = synthetic.make_dates(1, end='2019-12-31')
+    symbols = synthetic.make_symbols(4)
+    prices = synthetic.write_prices([BENCHMARK] + symbols, dates)
+    synthetic.write_forex(['USD', 'AUD'], dates)
+    trades = synthetic.make_trades(20, prices[symbols], ['USD', 'AUD'])
+    trades['Type'] = 'Buy'
+    synthetic.write_trades(trades)
+
+    first = trades['Date'].min()
+    values = pipeline.Analysis(frequency='D').between(first, first) \
+        .against(BENCHMARK).value()
+
+    # On the first trade date the benchmark holds exactly the cash paid
+    assert values['Portfolio'].iloc[0] == \
+        pytest.approx(values['Benchmark'].iloc[0], rel=1e-4)
@@ -0,0 +1,178 @@
+import os
+import time
+from urllib.parse import urlsplit
+import pandas as pd
+import pytest
+import cli
+import download
+import file
+import providers
+import store
+import warehouse
+
+CLOSES = pd.DataFrame({'Close': [10.0, 10.5]}, index=pd.DatetimeIndex(
+    ['2017-07-13', '2017-07-14'], name='Date'))
+
+XIGNITE_BODY = b'GlobalQuotes Date,GlobalQuotes Last\n7/14/2017,30.25\n'
+
+
+class FakeProvider(providers.Provider):
+    """Answers from memory, recording the symbols it was asked for"""
+
+    rate = 1000.0
+    suffixes = {'ASX': '.FAKE'}
+
+    def __init__(self, name, closes=CLOSES, error=None, delay=0):
+        self.name = name
+        self.closes = closes
+        self.error = error
+        self.delay = delay
+        self.symbols = []
+
+    def fetch_sync(self, symbol, start_date, end_date, timeout):
+        self.symbols.append(symbol)
+
+        # Like an HTTP client, a stalled request gives up after the timeout
+        if self.delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(symbol)
+        time.sleep(self.delay)
+
+        if self.error is not None:
+            raise self.error
+        return self.closes
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download, 'BACKOFF_BASE', 0)
+
+
+@pytest.fixture
+def csv_store(monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+
+
+def test_providers_implement_fetch_sync():
+    with pytest.raises(TypeError):
+        providers.Provider()
+
+
+def test_symbols_are_mapped_to_each_providers_symbology():
+    assert providers.XigniteProvider(host='').provider_symbol('BHP.AX') == \
+        'BHP.XASX'
+    assert providers.YFinanceProvider().provider_symbol('BHP.XASX') == \
+        'BHP.AX'
+    assert providers.YFinanceProvider().provider_symbol('AAPL') == 'AAPL'
+
+
+def test_refresh_stores_what_the_first_provider_returns(data_directory,
+                                                        csv_store):
+    first = FakeProvider('first')
+    second = FakeProvider('second')
+
+    failed = providers.refresh(['BHP.AX', 'CBA.AX'], '2017-07-13',
+                               '2017-07-14', providers=[first, second])
+
+    assert failed == {}
+    assert sorted(first.symbols) == ['BHP.FAKE', 'CBA.FAKE']
+    assert second.symbols == []
+    pd.testing.assert_frame_equal(store.read_frame('BHP.AX'), CLOSES,
+                                  check_freq=False)
+    assert warehouse.read_history('CBA.AX')['Close'].tolist() == [10.0, 10.5]
+
+
+def test_fails_over_to_the_next_provider(data_directory, csv_store):
+    failing = FakeProvider('failing', error=ValueError('no data'))
+    backup = FakeProvider('backup')
+
+    failed = providers.refresh(['BHP.AX'], '2017-07-13', '2017-07-14',
+                               providers=[failing, backup])
+
+    assert failed == {}
+    assert failing.symbols == backup.symbols == ['BHP.FAKE']
+    assert store.read_frame('BHP.AX')['Close'].tolist() == [10.0, 10.5]
+
+
+def test_slow_providers_time_out(data_directory, csv_store):
+    slow = FakeProvider('slow', delay=60)
+    slow.timeout = 0.2
+
+    started = time.monotonic()
+    failed = providers.refresh(['BHP.AX'], '2017-07-13', '2017-07-14',
+                               providers=[slow, FakeProvider('backup')])
+
+    assert failed == {}
+    assert time.monotonic() - started < 5
+
+
+def test_reports_symbols_no_provider_could_fetch(data_directory, csv_store):
+    failing = FakeProvider('failing', error=ValueError('no data'))
+
+    failed = providers.refresh(['BHP.AX'], '2017-07-13', '2017-07-14',
+                               providers=[failing])
+
+    assert list(failed) == ['BHP.AX']
+    assert isinstance(failed['BHP.AX']['failing'], ValueError)
+
+
+def test_stalled_xignite_requests_time_out(http_server, data_directory,
+                                           csv_store, monkeypatch):
+    monkeypatch.setenv('XIGNITE_API_KEY', 'key')
+    xignite = providers.XigniteProvider(host=http_server.url)
+    xignite.timeout = 0.2
+    xignite.retries = 0
+
+    url = urlsplit(xignite.make_url('BHP.XASX', '2017-07-13', '2017-07-14'))
+    request = url.path + '?' + url.query
+    http_server.responses[request] = [(200, XIGNITE_BODY)]
+    http_server.delays[request] = 2
+
+    started = time.monotonic()
+    failed = providers.refresh(['BHP.AX'], '2017-07-13', '2017-07-14',
+                               providers=[xignite, FakeProvider('backup')])
+
+    assert failed == {}
+    assert time.monotonic() - started < 1.5
+    assert store.read_frame('BHP.AX')['Close'].tolist() == [10.0, 10.5]
+
+
+def test_alpha_vantage_errors_fail_over(http_server, data_directory,
+                                        csv_store, monkeypatch):
+    monkeypatch.setenv('ALPHA_VANTAGE_API_KEY', 'key')
+    alpha_vantage = providers.AlphaVantageProvider(host=http_server.url)
+    alpha_vantage.rate = 1000.0
+
+    url = urlsplit(alpha_vantage.make_url('MQG.AX', '2017-07-13'))
+    http_server.responses[url.path + '?' + url.query] = [
+        (200, b'{"Note": "API call frequency exceeded"}')]
+    backup = FakeProvider('backup')
+
+    failed = providers.refresh(['MQG.AX'], '2017-07-13', '2017-07-14',
+                               providers=[alpha_vantage, backup])
+
+    assert failed == {}
+    assert backup.symbols == ['MQG.FAKE']
+
+
+def test_xignite_script_fetches_from_the_configured_host(
+        http_server, data_directory, csv_store, monkeypatch):
+    script = cli.load('market-data-xignite')
+    monkeypatch.setattr(providers, 'XIGNITE_HOST', http_server.url)
+    monkeypatch.setenv('XIGNITE_API_KEY', 'key')
+
+    xignite = providers.XigniteProvider()
+    for symbol in ['BHP.XASX', 'CBA.XASX']:
+        url = urlsplit(xignite.make_url(symbol, script.START_DATE,
+                                        script.END_DATE))
+        http_server.responses[url.path + '?' + url.query] = [
+            (503, b''), (200, XIGNITE_BODY)]
+
+    failed = script.download_all_hist_data(['BHP', 'CBA'])
+
+    assert failed == {}
+    assert len(http_server.requests) == 4
+    assert store.read_frame('CBA.XASX')['Close'].tolist() == [30.25]
+    assert os.path.exists(file.make_path('CBA.XASX',
+                                         file.LEGACY_PRICES_DIRECTORY))
+    assert warehouse.read_history('BHP.XASX')['Close'].tolist() == [30.25]
@@ -0,0 +1,23 @@
+import sys
+import pandas as pd
+import pytest
+import render
+
+
+def test_charts_are_named_after_their_title(monkeypatch):
+    monkeypatch.setattr(render, 'CHART_DIRECTORY', 'out')
+
+    assert render.chart_path('Portfolio value') == 'out/portfolio-value.png'
+
+
+def test_plots_are_saved_without_pyplot(tmp_path, monkeypatch):
+    pytest.importorskip('matplotlib')
+    monkeypatch.setattr(render, 'CHART_DIRECTORY', str(tmp_path / 'charts'))
+    df = pd.DataFrame({'Portfolio': [1.0, 2.0, 1.5]},
+                      index=pd.date_range('2020-01-01', periods=3))
+
+    path = render.plot_data(df)
+
+    assert path == str(tmp_path / 'charts' / 'portfolio-value.png')
+    assert (tmp_path / 'charts' / 'portfolio-value.png').stat().st_size > 0
+    assert 'matplotlib.pyplot' not in sys.modules
@@ -0,0 +1,71 @@
+import os
+import pandas as pd
+import pytest
+import file
+import store
+
+
+@pytest.fixture
+def feather_store(data_directory, monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'feather')
+
+
+def write_csv(name, rows):
+    path = file.make_path(name)
+    with open(path, 'w') as handle:
+        handle.write('Date,Close\n')
+        for date, close in rows:
+            handle.write(f'{date},{close}\n')
+    return path
+
+
+def test_csv_is_migrated_to_feather(feather_store):
+    write_csv('AAA', [('2020-01-01', 1.5), ('2020-01-02', 2.5)])
+
+    assert store.read_frame('AAA')['Close'].tolist() == [1.5, 2.5]
+    feather_path = file.make_path('AAA', extension='feather')
+    assert os.path.exists(feather_path)
+    assert store.read_feather_frame(feather_path)['Close'].tolist() == [1.5,
+                                                                        2.5]
+
+
+def test_feather_is_rebuilt_when_the_csv_is_newer(feather_store):
+    csv_path = write_csv('AAA', [('2020-01-01', 1.5)])
+    store.read_frame('AAA')
+    feather_path = file.make_path('AAA', extension='feather')
+    assert not store.is_stale(feather_path, csv_path)
+
+    write_csv('AAA', [('2020-01-01', 1.5), ('2020-01-02', 2.5)])
+    modified = os.stat(feather_path).st_mtime_ns + 1
+    os.utime(csv_path, ns=(modified, modified))
+    assert store.is_stale(feather_path, csv_path)
+
+    assert store.read_frame('AAA')['Close'].tolist() == [1.5, 2.5]
+    assert not store.is_stale(feather_path, csv_path)
+
+
+def test_feather_files_are_read_on_their_own(feather_store):
+    write_csv('AAA', [('2020-01-01', 1.5)])
+    store.read_frame('AAA')
+    os.remove(file.make_path('AAA'))
+
+    assert store.read_frame('AAA')['Close'].tolist() == [1.5]
+    with pytest.raises(FileNotFoundError):
+        store.read_frame('BBB')
+
+
+def test_feather_date_slicing(feather_store):
+    write_csv('AAA', [('2020-01-01', 1.0), ('2020-01-03', 3.0),
+                      ('2020-01-05', 5.0), ('2020-01-07', 7.0)])
+    store.read_frame('AAA')
+    path = file.make_path('AAA', extension='feather')
+
+    def closes(**kwargs):
+        return store.read_feather_frame(path, ['Close'], **kwargs)[
+            'Close'].tolist()
+
+    assert closes(start='2020-01-03', end='2020-01-05') == [3.0, 5.0]
+    assert closes(start='2020-01-04') == [5.0, 7.0]
+    assert closes(end='2020-01-02') == [1.0]
+    assert closes(start='2020-01-04', asof=True) == [3.0, 5.0, 7.0]
+    assert closes(start='2020-01-08', end='2020-01-09') == []
@@ -0,0 +1,49 @@
+import numpy as np
+import holdings
+import synthetic
+import valuation
+
+BENCHMARK = '^AXJO'
+
+
+def make_data():
+    dates = synthetic.make_dates(1)
+    symbols = synthetic.make_symbols(5)
+    prices = synthetic.make_prices([BENCHMARK] + symbols, dates)
+    trades = synthetic.make_trades(200, prices[symbols], ['USD'])
+    return trades, prices
+
+
+def full(trades, prices):
+    return holdings.get_portfolio_value_over_time(trades, prices,
+                                                  benchmark_symbol=BENCHMARK)
+
+
+def test_extends_the_saved_valuation(data_directory):
+    trades, prices = make_data()
+    split = prices.index[150]
+    old_trades = trades[trades['Date'] <= split]
+
+    valuation.update_portfolio_value('test', old_trades,
+                                     prices.loc[:split],
+                                     benchmark_symbol=BENCHMARK)
+    values = valuation.update_portfolio_value('test', trades, prices,
+                                              benchmark_symbol=BENCHMARK)
+
+    np.testing.assert_allclose(values.values, full(trades, prices).values)
+
+
+def test_revised_earlier_prices_are_revalued(data_directory):
+    trades, prices = make_data()
+    split = prices.index[150]
+
+    valuation.update_portfolio_value('test', trades, prices.loc[:split],
+                                     benchmark_symbol=BENCHMARK)
+
+    # An adjustment re-fetch halves every earlier price
+    revised = prices.copy()
+    revised.loc[:split] /= 2
+    values = valuation.update_portfolio_value('test', trades, revised,
+                                              benchmark_symbol=BENCHMARK)
+
+    np.testing.assert_allclose(values.values, full(trades, revised).values)
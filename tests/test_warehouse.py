@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+import cli
+import file
+import pipeline
+import store
+import synthetic
+import warehouse
+
+CLOSES = pd.DataFrame({'Close': [1.5, 2.5]}, index=pd.DatetimeIndex(
+    ['2020-01-02', '2020-01-03'], name='Date'))
+
+
+@pytest.fixture
+def warehouse_store(data_directory, monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'warehouse')
+
+
+def test_datasets_keep_the_same_name_apart(warehouse_store):
+    warehouse.upsert({'AUD': CLOSES})
+    warehouse.upsert({'AUD': CLOSES * 10}, 'forex')
+
+    assert store.read_frame('AUD')['Close'].tolist() == [1.5, 2.5]
+    assert store.read_frame('AUD', 'forex')['Close'].tolist() == [15, 25]
+
+
+def test_legacy_directories_are_imported_as_datasets(warehouse_store):
+    legacy = file.make_path('BHP.XASX', file.LEGACY_PRICES_DIRECTORY)
+    with open(legacy, 'w') as handle:
+        handle.write('GlobalQuotes Date,GlobalQuotes Last\n7/14/2017,30.25\n')
+    with open(file.make_path('BHP.XASX'), 'w') as handle:
+        handle.write('Date,Close\n2017-07-14,40.5\n')
+
+    assert warehouse.import_legacy() == {}
+
+    assert store.read_frame('BHP.XASX')['Close'].tolist() == [40.5]
+    assert store.read_frame('BHP.XASX', file.LEGACY_PRICES_DIRECTORY)[
+        'Close'].tolist() == [30.25]
+
+
+def test_reads_share_one_connection(warehouse_store, monkeypatch):
+    warehouse.upsert({'AAA': CLOSES, 'BBB': CLOSES})
+    opened = []
+    connect = warehouse.connect
+    monkeypatch.setattr(warehouse, 'connect',
+                        lambda path=None: opened.append(path) or connect(path))
+
+    for _ in range(3):
+        warehouse.read_history('AAA')
+        warehouse.read_field(['AAA', 'BBB'])
+
+    assert opened == []
+
+
+def test_pipeline_reads_the_warehouse_in_one_query(data_directory,
+                                                   monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    dates = synthetic.make_dates(1, end='2019-12-31')
+    symbols = synthetic.make_symbols(4)
+    prices = synthetic.write_prices(symbols, dates)
+    synthetic.write_trades(synthetic.make_trades(30, prices, ['USD']))
+    expected = pipeline.Analysis(frequency='W').value()
+
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'warehouse')
+    warehouse.import_legacy([file.PRICES_DIRECTORY])
+    queries = []
+    read_field = warehouse.read_field
+    monkeypatch.setattr(warehouse, 'read_field',
+                        lambda *args, **kwargs: queries.append(args) or
+                        read_field(*args, **kwargs))
+
+    values = pipeline.Analysis(frequency='W').value()
+
+    assert len(queries) == 1
+    pd.testing.assert_frame_equal(values, expected)
+
+
+def test_scripts_read_legacy_prices_from_the_warehouse(warehouse_store):
+    script = cli.load('portfolio-excl-benchmark')
+    warehouse.upsert({'BHP.XASX': CLOSES}, file.LEGACY_PRICES_DIRECTORY)
+
+    df = script.read_historical_csv('BHP', exchange='ASX')
+
+    assert df['BHP.XASX'].tolist() == [1.5, 2.5]
+
+
+def test_scripts_read_legacy_layouts_from_csv(data_directory, monkeypatch):
+    monkeypatch.setattr(store, 'STORE_FORMAT', 'csv')
+    script = cli.load('portfolio-excl-benchmark')
+    path = file.make_path('BHP.XASX', file.LEGACY_PRICES_DIRECTORY)
+    with open(path, 'w') as handle:
+        handle.write('GlobalQuotes Date,GlobalQuotes Last\n7/14/2017,30.25\n')
+
+    df = script.read_historical_csv('BHP', exchange='ASX')
+
+    assert df['BHP.XASX'].tolist() == [30.25]
+    assert df.index[0] == pd.Timestamp('2017-07-14')
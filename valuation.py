@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import pandas as pd
+import benchmark
+import file
+import holdings
+import instrument
+
+STATE_DIRECTORY = "state"
+
+
+def state_path(name):
+    return file.make_path(name, STATE_DIRECTORY, 'pkl')
+
+
+def load_state(name):
+    """Return the saved valuation state for name, or None"""
+    try:
+        with open(state_path(name), 'rb') as handle:
+            return pickle.load(handle)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def save_state(name, state):
+    path = state_path(name)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as handle:
+        pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def row_key(trades, position):
+    """Return a summary of one trade, used to check the ledger hasn't been
+    rewritten before the trades already valued"""
+    return tuple(str(value) for value in trades.iloc[position].values)
+
+
+def price_fingerprint(prices, last_date):
+    """Return a hash of the prices before last_date, which changes if any of
+    them are revised, e.g. when a history is re-fetched after an adjustment"""
+    before = prices.loc[prices.index < last_date]
+    hashed = pd.util.hash_pandas_object(before, index=True).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def positions_from(initial, changes, index):
+    """Return cumulative positions over index starting from the initial
+    positions (a series indexed by symbol)"""
+    columns = initial.index.union(changes.columns)
+    matrix = changes.reindex(columns=columns, fill_value=0).values.copy()
+    matrix[0] += initial.reindex(columns, fill_value=0).values
+    return holdings.carry_forward(
+        pd.DataFrame(matrix, index=index, columns=columns), index)
+
+
+def value_from(state, trades, prices, benchmark_symbol):
+    """Value the dates in prices starting from the positions in state, given
+    only the trades that aren't yet in state. Returns the values and the
+    positions on the last date."""
+    index = prices.index
+
+    changes = holdings.get_position_changes(trades, index, ['Symbol'])
+    positions = positions_from(state['positions'], changes, index)
+
+    values = pd.DataFrame(index=index.values)
+    values['Portfolio'] = holdings.value_positions(
+        positions, (prices, positions.columns)).values
+    # Sold out symbols don't need to be carried into the next update
+    last_positions = positions.iloc[-1]
+    last_positions = last_positions[last_positions != 0]
+
+    if benchmark_symbol is not None:
+        # The units are already signed, so every benchmark trade is a buy
+        units = benchmark.get_component_units(trades, prices,
+                                              [(benchmark_symbol, 1.0)])
+        bm_trades = trades.assign(Shares=units[:, 0], Symbol=benchmark_symbol,
+                                  Type='Buy')
+        bm_changes = holdings.get_position_changes(bm_trades, index, ['Symbol'])
+        bm_positions = positions_from(state['bm_positions'], bm_changes, index)
+        values['Benchmark'] = holdings.value_positions(
+            bm_positions, (prices, bm_positions.columns)).values
+        bm_last_positions = bm_positions.iloc[-1]
+    else:
+        bm_last_positions = pd.Series(dtype=float)
+
+    return values, last_positions, bm_last_positions
+
+
+def is_reusable(state, trades, prices, exchange, benchmark_symbol):
+    """Return whether state can be extended rather than rebuilt"""
+    if state is None:
+        return False
+
+    # The valuation settings and price columns must be unchanged
+    settings = (exchange, benchmark_symbol, tuple(prices.columns))
+    if state['settings'] != settings:
+        return False
+
+    # Trades are only ever appended to the ledger
+    count = state['trade_count']
+    if len(trades) < count or (count and row_key(trades, count - 1) != state['last_trade']):
+        return False
+
+    # Every new trade has to fall after the last valued date
+    new_dates = trades['Date'].iloc[count:]
+    if not (new_dates > state['last_date']).all() or \
+            state['last_date'] not in prices.index:
+        return False
+
+    # The prices already valued must not have been revised
+    return state.get('prices') == price_fingerprint(prices, state['last_date'])
+
+
+@instrument.timed('update_valuation')
+def update_portfolio_value(name, trades, prices, exchange='', benchmark_symbol=None):
+    """Return the portfolio value over time, reusing the valuation saved under
+    name so that only dates from the last valued date onwards are recomputed.
+
+    The saved state holds the cumulative positions on the last valued date.
+    New trades (appended to the ledger and dated after that date) and newly
+    appended prices only update the suffix of the series. Anything else, such
+    as back-dated trades or revised earlier prices, falls back to a full
+    valuation."""
+    state = load_state(name)
+    empty = pd.Series(dtype=float)
+
+    if is_reusable(state, trades, prices, exchange, benchmark_symbol):
+        new_trades = pd.concat([state['pending'],
+                                trades.iloc[state['trade_count']:]])
+        last_date = state['last_date']
+
+        # Revalue the last valued date too, in case its price has been revised
+        suffix_prices = prices.loc[prices.index >= last_date]
+        kept = state['values'].loc[state['values'].index < last_date]
+    else:
+        new_trades = trades
+        state = {'positions': empty, 'bm_positions': empty}
+        suffix_prices = prices
+        kept = None
+
+    # Trades after the last price date are kept until there are prices for them
+    is_pending = (new_trades['Date'] > prices.index[-1]).values
+    pending = new_trades[is_pending]
+    new_trades = next(holdings.priced_trades(new_trades[~is_pending], prices,
+                                             exchange))
+
+    suffix, positions, bm_positions = value_from(
+        state, new_trades, suffix_prices, benchmark_symbol)
+    values = suffix if kept is None else pd.concat([kept, suffix])
+
+    save_state(name, {
+        'settings': (exchange, benchmark_symbol, tuple(prices.columns)),
+        'trade_count': len(trades),
+        'last_trade': row_key(trades, len(trades) - 1) if len(trades) else None,
+        'last_date': prices.index[-1],
+        'prices': price_fingerprint(prices, prices.index[-1]),
+        'positions': positions,
+        'bm_positions': bm_positions,
+        'pending': pending,
+        'values': values,
+    })
+
+    return values
@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+import file
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Embedded database holding every stored price and forex history in one
+# (dataset, symbol, date, field, value) table, where the dataset is the
+# directory the history would otherwise be stored in (e.g. historical_prices
+# or forex), so the same name can be stored in each. SQLite is always
+# available; DuckDB is used instead if PORTFOLIO_WAREHOUSE_ENGINE=duckdb and
+# it is installed.
+WAREHOUSE_FILE = 'warehouse'
+WAREHOUSE_ENGINE = os.environ.get('PORTFOLIO_WAREHOUSE_ENGINE', 'sqlite')
+
+# Most symbols bound into one IN (...) clause
+QUERY_CHUNK_SIZE = 500
+
+# Column names used by each of the legacy CSV layouts, mapped to fields
+LAYOUTS = {
+    # Yahoo Finance table.csv downloads, read by portfolio.py
+    'yahoo': ('Date', {'Open': 'Open', 'High': 'High', 'Low': 'Low',
+                       'Close': 'Close', 'Adj Close': 'Adj Close',
+                       'Volume': 'Volume'}),
+    # Xignite GetGlobalHistoricalQuotesRange, read by
+    # portfolio-excl-benchmark.py
+    'xignite': ('GlobalQuotes Date', {'GlobalQuotes Open': 'Open',
+                                      'GlobalQuotes High': 'High',
+                                      'GlobalQuotes Low': 'Low',
+                                      'GlobalQuotes Last': 'Close',
+                                      'GlobalQuotes Volume': 'Volume'}),
+    # Date,Close written by the yfinance downloader and providers.py
+    'close': ('Date', {'Close': 'Close'}),
+}
+
+# Directories the legacy layouts were written to
+LEGACY_DIRECTORIES = [file.PRICES_DIRECTORY, file.LEGACY_PRICES_DIRECTORY,
+                      'forex']
+
+# Connections opened by shared(), one per thread (connections can't be used
+# from other threads) and per process (nor after a fork)
+local = threading.local()
+
+
+def use_duckdb():
+    return WAREHOUSE_ENGINE == 'duckdb' and duckdb is not None
+
+
+def warehouse_path():
+    extension = 'duckdb' if use_duckdb() else 'sqlite'
+    return os.path.join(file.DATA_DIRECTORY,
+                        '{}.{}'.format(WAREHOUSE_FILE, extension))
+
+
+def connect(path=None):
+    """Open the warehouse, creating the table the first time.
+
+    The primary key clusters the rows by dataset, symbol then date, so a date
+    range of one symbol is a single contiguous index range."""
+    path = warehouse_path() if path is None else path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    if use_duckdb():
+        connection = duckdb.connect(path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS histories (dataset TEXT, symbol TEXT, '
+            'date TEXT, field TEXT, value DOUBLE, '
+            'PRIMARY KEY (dataset, symbol, date, field))')
+        return connection
+
+    # Transactions are begun and committed explicitly
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS histories (dataset TEXT NOT NULL, '
+        'symbol TEXT NOT NULL, date TEXT NOT NULL, field TEXT NOT NULL, '
+        'value REAL, PRIMARY KEY (dataset, symbol, date, field)) '
+        'WITHOUT ROWID')
+    return connection
+
+
+def shared():
+    """Return this thread's connection to the warehouse, opening it (and
+    creating the table) only the first time, so repeated reads don't pay for
+    a new connection each"""
+    key = (os.getpid(), warehouse_path())
+    connections = local.__dict__.setdefault('connections', {})
+    if key not in connections:
+        connections[key] = connect(key[1])
+    return connections[key]
+
+
+def query(connection, sql, params):
+    if use_duckdb():
+        return connection.execute(sql, params).df()
+    return pd.read_sql_query(sql, connection, params=params)
+
+
+def to_rows(dataset, symbol, df):
+    """Return (dataset, symbol, date, field, value) rows for a date indexed
+    frame of fields, leaving out missing values"""
+    dates = pd.DatetimeIndex(df.index).strftime('%Y-%m-%d')
+    long = pd.DataFrame(df.values, index=dates, columns=df.columns) \
+        .stack().dropna()
+    return [(dataset, symbol, date, field, float(value))
+            for (date, field), value in long.items()]
+
+
+def upsert(histories, dataset=file.PRICES_DIRECTORY, connection=None):
+    """Insert or replace the rows of a dict of symbol to date indexed frame of
+    fields (e.g. Close) in a dataset, all in one transaction"""
+    rows = [row for symbol, df in histories.items()
+            for row in to_rows(dataset, symbol, df)]
+    if not rows:
+        return 0
+
+    connection = shared() if connection is None else connection
+    try:
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO histories VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (dataset, symbol, date, field) DO UPDATE SET '
+            'value = excluded.value', rows)
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+
+    return len(rows)
+
+
+def date_filter(start, end, asof=False):
+    """Return the SQL clauses and parameters selecting dates from start to
+    end. With asof set, the rows start at the last date on or before start,
+    so the quote in effect on the start date is included."""
+    clauses = []
+    params = []
+    if start is not None:
+        start = pd.Timestamp(start).strftime('%Y-%m-%d')
+        if asof:
+            clauses.append(
+                'date >= COALESCE((SELECT MAX(date) FROM histories AS earlier '
+                'WHERE earlier.dataset = histories.dataset AND '
+                'earlier.symbol = histories.symbol AND '
+                'earlier.field = histories.field AND earlier.date <= ?), ?)')
+            params += [start, start]
+        else:
+            clauses.append('date >= ?')
+            params.append(start)
+    if end is not None:
+        clauses.append('date <= ?')
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    return ''.join(' AND ' + clause for clause in clauses), params
+
+
+def read_history(symbol, fields=None, start=None, end=None,
+                 dataset=file.PRICES_DIRECTORY, asof=False, connection=None):
+    """Return the stored fields (all of them by default) of one symbol in a
+    dataset between the start and end dates as a date indexed frame, like
+    store.read_frame (see date_filter for asof).
+
+    Raises FileNotFoundError if nothing is stored for the symbol."""
+    dates, params = date_filter(start, end, asof)
+    sql = 'SELECT date, field, value FROM histories ' \
+        'WHERE dataset = ? AND symbol = ?'
+    if fields is not None:
+        fields = list(fields)
+        sql += ' AND field IN ({})'.format(', '.join('?' * len(fields)))
+        params = fields + params
+    sql += dates + ' ORDER BY date'
+
+    connection = shared() if connection is None else connection
+    rows = query(connection, sql, [dataset, symbol] + params)
+
+    if rows.empty:
+        raise FileNotFoundError('No stored history for {}'.format(symbol))
+
+    df = rows.pivot(index='date', columns='field', values='value')
+    df.index = pd.DatetimeIndex(df.index, name='Date')
+    df.columns.name = None
+    return df if fields is None else df.reindex(columns=fields)
+
+
+def read_field(symbols, field='Close', start=None, end=None,
+               dataset=file.PRICES_DIRECTORY, asof=False, connection=None):
+    """Return a (date x symbol) frame of one field for many symbols in a
+    dataset between the start and end dates (see date_filter for asof), in
+    one query per QUERY_CHUNK_SIZE symbols"""
+    symbols = list(symbols)
+    dates, params = date_filter(start, end, asof)
+
+    connection = shared() if connection is None else connection
+    chunks = []
+    for i in range(0, len(symbols), QUERY_CHUNK_SIZE):
+        chunk = symbols[i:i + QUERY_CHUNK_SIZE]
+        sql = 'SELECT symbol, date, value FROM histories WHERE dataset = ? ' \
+            'AND field = ? AND symbol IN ({}){}'.format(
+                ', '.join('?' * len(chunk)), dates)
+        chunks.append(query(connection, sql,
+                            [dataset, field] + chunk + params))
+
+    rows = pd.concat(chunks) if chunks else \
+        pd.DataFrame(columns=['symbol', 'date', 'value'])
+    df = rows.pivot(index='date', columns='symbol', values='value')
+    df.index = pd.DatetimeIndex(df.index, name='Date')
+    df.columns.name = None
+    return df.reindex(columns=[symbol for symbol in symbols
+                               if symbol in df.columns])
+
+
+def detect_layout(columns):
+    for name, (date_column, fields) in LAYOUTS.items():
+        if date_column in columns and any(column in columns
+                                          for column in fields):
+            return name
+    raise ValueError('Unknown price file layout: {}'.format(list(columns)))
+
+
+def read_legacy_csv(path):
+    """Read a price or forex CSV in any of the legacy layouts into a dataframe
+    indexed by (timezone naive) date, with the layout's columns renamed to the
+    common field names (e.g. Xignite's GlobalQuotes Last becomes Close)"""
+    df = pd.read_csv(path, na_values=['nan'])
+    date_column, fields = LAYOUTS[detect_layout(df.columns)]
+    df = df.rename(columns=dict(fields, **{date_column: 'Date'}))
+
+    # Yahoo Finance writes timezone offsets that change with daylight saving,
+    # so keep only the date part
+    df['Date'] = pd.to_datetime(df['Date'].astype(str).str[:10])
+
+    return df.set_index('Date')
+
+
+def layout_fields(df):
+    """Return only the columns of a read_legacy_csv frame that are fields of
+    one of the layouts"""
+    fields = {field for _, names in LAYOUTS.values()
+              for field in names.values()}
+    return df[[column for column in df.columns if column in fields]]
+
+
+def import_legacy(directories=LEGACY_DIRECTORIES, connection=None):
+    """Load every CSV under the legacy data directories into the warehouse,
+    named after the file in a dataset named after its directory. Returns the
+    files that couldn't be read."""
+    failed = {}
+    connection = shared() if connection is None else connection
+    for dataset in directories:
+        directory = os.path.join(file.DATA_DIRECTORY, dataset)
+        if not os.path.isdir(directory):
+            continue
+
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.csv'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                df = layout_fields(read_legacy_csv(path))
+            except (ValueError, KeyError) as err:
+                failed[path] = err
+                continue
+            upsert({os.path.splitext(name)[0]: df}, dataset, connection)
+
+    return failed
+
+
+if __name__ == "__main__":
+    for path, err in import_legacy().items():
+        print('Failed to import {}: {}'.format(path, err))